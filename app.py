@@ -1,17 +1,80 @@
-from flask import Flask, render_template, jsonify, request
+from flask import (Blueprint, Flask, Response, render_template, jsonify, request, redirect,
+                   send_from_directory, stream_with_context)
 from flask_cors import CORS
-import sqlite3
-import qrcode
-from datetime import datetime, timedelta
-from PIL import Image, ImageDraw, ImageFont
+from functools import wraps
+from threading import Lock
+from urllib.parse import unquote, urlsplit
+import hmac
 import os
+import sqlite3
+import time
+
+# PIL/qrcode (rendering, template_registry) are imported lazily on first render
+from fast_json import dumps, json_response
+import base64
+import db
+from fingerprints import certificate_fingerprint, rendered_fingerprint
+from http_cache import POLICIES, cached, not_modified
+import compression
+import rate_limit
+import render_queue
+import signing
+
+bp = Blueprint('certificates', __name__)
+
+INTERNSHIP_END_DATE = "2025-08-19"
+
+# Page size for /api/certificates
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Fuzzy search: seconds between index top-ups, time budget
+NAME_INDEX_REFRESH = 5.0
+FUZZY_BUDGET_MS = 50.0
+
+# CERT_SNAPSHOT=1 serves lookups and searches from an in-memory copy of the
+# table, re-checked against db.data_version() every CERT_SNAPSHOT_REFRESH seconds
+CERT_SNAPSHOT = os.environ.get('CERT_SNAPSHOT', '0') == '1'
+SNAPSHOT_REFRESH = float(os.environ.get('CERT_SNAPSHOT_REFRESH', 2.0))
+
+# Pages precompressed during warmup (identical for every certificate)
+WARM_PAGES = ['/', '/verify/CERT001', '/certificate/CERT001']
+
+# Set WARMUP_RENDERER=0 on metadata-only workers to skip loading templates/fonts
+WARMUP_RENDERER = os.environ.get('WARMUP_RENDERER', '1') != '0'
+
+# Seconds a request waits for the shared render queue before giving up with a 503
+RENDER_WAIT = float(os.environ.get('RENDER_WAIT', 30))
+
+# Bearer token for admin routes (they are disabled while unset)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
 
-app = Flask(__name__)
-CORS(app)
+# Origins allowed to call /api/* cross-origin (comma-separated); default: our own site
+CORS_ORIGINS = [origin.strip() for origin in os.environ.get('CORS_ORIGINS', '').split(',')
+                if origin.strip()]
 
-# Create necessary directories
-os.makedirs('static/certificates', exist_ok=True)
-os.makedirs('static/templates', exist_ok=True)
+# Uploads to /api/tamper-check: request size, decoded pixels, and how far the
+# aspect ratio may be off the template's before it isn't a whole certificate
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_MB', 10)) * 1024 * 1024
+MAX_UPLOAD_PIXELS = 40_000_000
+UPLOAD_ASPECT_TOLERANCE = 0.03
+
+# Region hashes saved per commit during an inline regeneration
+HASHES_COMMIT_EVERY = 20
+
+# Templates are discovered once and looked up by key/domain per render
+_template_registry = None
+
+_renderers = {}
+_render_lock = Lock()
+
+_name_index = None
+_name_index_checked = 0.0
+_name_index_lock = Lock()
+
+_snapshot = None
+_snapshot_checked = 0.0
+_snapshot_lock = Lock()
 
 def get_base_url():
     """Get the correct base URL based on environment"""
@@ -20,45 +83,64 @@ def get_base_url():
     else:
         return "http://192.168.0.66:5000"
 
+def allowed_origins():
+    """Origins allowed to make cross-origin API calls"""
+    return CORS_ORIGINS or [get_base_url()]
+
 def init_db():
-    """Initialize database with sample certificates"""
-    conn = sqlite3.connect('certificates.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS certificates
-                 (id TEXT PRIMARY KEY, 
-                  name TEXT, 
-                  domain TEXT, 
-                  issue_date TEXT,
-                  certificate_url TEXT)''')
+    """Migrate the schema and seed the sample certificates"""
+    conn = db.connect()
+    db.migrate(conn)
     
     # Sample certificates
     certificates = [
-        ('CERT001', 'PULLABHOTLA VENKATARAMA SASTRY', 'Full Stack Web Development', '2025-05-219', ''),
-        ('CERT002', 'kovuru Praneeth', 'Full Stack Web Development', '2025-05-19', ''),
-        ('CERT003', 'DODDA YUVARATNA', 'Full Stack Web Development', '2025-05-19', ''),
-        ('CERT004', 'GOTTEMUKKALA KEERTHI', 'Full Stack Web Development', '2025-05-19', ''),
-        ('CERT005', 'TATIPAKALA VINEELA', 'Full Stack Web Development', '2025-05-19', ''),
-        ('CERT006', 'CHEGIREDDY KARTHEEK REDDY', 'Full Stack Web Development', '2025-05-19', ''),
-        ('CERT007', 'SINGAMPALLI UMA JAYA SREE', 'Full Stack Web Development', '2025-05-19', ''),
-        ('CERT008', 'MANDALAPU MARUTHI SAI KRISHNA', 'Full Stack Web Development', '2025-05-19', ''),
+        ('CERT001', 'PULLABHOTLA VENKATARAMA SASTRY', 'Full Stack Web Development', '2025-05-19'),
+        ('CERT002', 'kovuru Praneeth', 'Full Stack Web Development', '2025-05-19'),
+        ('CERT003', 'DODDA YUVARATNA', 'Full Stack Web Development', '2025-05-19'),
+        ('CERT004', 'GOTTEMUKKALA KEERTHI', 'Full Stack Web Development', '2025-05-19'),
+        ('CERT005', 'TATIPAKALA VINEELA', 'Full Stack Web Development', '2025-05-19'),
+        ('CERT006', 'CHEGIREDDY KARTHEEK REDDY', 'Full Stack Web Development', '2025-05-19'),
+        ('CERT007', 'SINGAMPALLI UMA JAYA SREE', 'Full Stack Web Development', '2025-05-19'),
+        ('CERT008', 'MANDALAPU MARUTHI SAI KRISHNA', 'Full Stack Web Development', '2025-05-19'),
     ]
     
-    c.executemany('INSERT OR IGNORE INTO certificates VALUES (?,?,?,?,?)', certificates)
-    conn.commit()
+    db.insert_certificates(conn, certificates, end_date_for=calculate_end_date)
     conn.close()
     print("✅ Database initialized")
 
-def create_qr_code_image(cert_id):
-    """Generate QR code for certificate verification"""
-    base_url = get_base_url()
-    verification_url = f"{base_url}/verify/{cert_id}"
+def calculate_end_date(issue_date):
+    """End date printed on certificates (fixed to 2025-08-19)"""
+    return INTERNSHIP_END_DATE
+
+def certificate_version(cert_id, name, domain, issue_date):
+    """Fingerprint of a certificate row, used for ETags and image URLs"""
+    template = get_template_registry().for_domain(domain)
+    return certificate_fingerprint(cert_id, name, domain, issue_date,
+                                   calculate_end_date(issue_date), get_base_url(),
+                                   template.version if template else None)
+
+def get_template_registry():
+    """Template registry, built on first use"""
+    global _template_registry
+    if _template_registry is None:
+        from template_registry import TemplateRegistry
+        _template_registry = TemplateRegistry()
+    return _template_registry
+
+def get_renderer(domain=None):
+    """Shared renderer per template so renders reuse the loaded template and fonts"""
+    from rendering import CertificateRenderer
     
-    print(f"🔗 QR Code URL: {verification_url}")
+    template = get_template_registry().for_domain(domain)
+    if template is None:
+        return None
     
-    qr = qrcode.QRCode(version=1, box_size=10, border=2)
-    qr.add_data(verification_url)
-    qr.make(fit=True)
-    return qr.make_image(fill_color="black", back_color="white")
+    base_url = get_base_url()
+    renderer = _renderers.get(template.key)
+    if renderer is None or renderer.template is not template or renderer.base_url != base_url:
+        renderer = CertificateRenderer(template, base_url)
+        _renderers[template.key] = renderer
+    return renderer
 
 def generate_certificate_image(name, domain, start_date, end_date, cert_id):
     """Generate certificate using template"""
@@ -71,99 +153,24 @@ def generate_certificate_image(name, domain, start_date, end_date, cert_id):
         print(f"   ID: {cert_id}")
         print(f"{'='*80}\n")
         
-        # Check if template exists
-        template_path = 'static/templates/blank_certificate_template.jpg'
-        
-        if not os.path.exists(template_path):
-            print("❌ TEMPLATE NOT FOUND!")
-            print("⚠️  Please run the setup script first:")
-            print("    python setup_certificate.py")
-            return None
-        
-        # Open the blank template
-        certificate = Image.open(template_path).convert('RGB')
-        draw = ImageDraw.Draw(certificate)
-        width, height = certificate.size
-        
-        print(f"📐 Template size: {width}x{height}")
-        
-        # Load fonts
-        try:
-            # Linux fonts (for Render)
-            name_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSerif-Italic.ttf", 60)
-            domain_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 26)
-            text_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 19)
-            print("✅ Loaded Linux fonts")
-        except:
-            try:
-                # Windows fonts
-                name_font = ImageFont.truetype("C:\\Windows\\Fonts\\georgiai.ttf", 60)
-                domain_font = ImageFont.truetype("C:\\Windows\\Fonts\\arialbd.ttf", 26)
-                text_font = ImageFont.truetype("C:\\Windows\\Fonts\\arial.ttf", 19)
-                print("✅ Loaded Windows fonts")
-            except:
-                print("⚠️ Using default fonts")
-                name_font = ImageFont.load_default()
-                domain_font = ImageFont.load_default()
-                text_font = ImageFont.load_default()
-        
-        # Colors
-        gold_tan = (184, 134, 86)
-        black = (0, 0, 0)
-        gray = (128, 128, 128)
-        
-        center_x = width // 2
-        
-        # Draw name
-        name_y = int(height * 0.515)
-        draw.text((center_x, name_y), name, fill=gold_tan, font=name_font, anchor="mm")
-        print(f"✅ Drew name: {name}")
-        
-        # Draw underline
-        underline_y = name_y + 50
-        underline_length = 300
-        draw.line([center_x - underline_length, underline_y, 
-                   center_x + underline_length, underline_y], 
-                  fill=gray, width=2)
-        
-        # Calculate dates
-        # Calculate dates
-        start_str = start_date
-        end_str = "2025-08-19"
-        
-        print(f"📅 Dates: {start_str} to {end_str}")
-        
-        # Draw text line 1
-        text1_y = int(height * 0.633)
-        text1 = "has successfully completed the internship "
-        draw.text((center_x, text1_y), text1, fill=black, font=text_font, anchor="mm")
-        
-        # Draw domain
-        domain_y = int(height * 0.673)
-        draw.text((center_x, domain_y), domain, fill=black, font=domain_font, anchor="mm")
-        print(f"✅ Drew domain: {domain}")
-        
-        # Draw text line 2
-        dates_y = int(height * 0.712)
-        dates_text = f"conducted by Nxtsync from {start_str} to {end_str}."
-        draw.text((center_x, dates_y), dates_text, fill=black, font=text_font, anchor="mm")
-        print(f"✅ Drew dates line")
-        
-        # Add QR code
-        qr_img = create_qr_code_image(cert_id)
-        qr_size = 140
-        qr_img = qr_img.resize((qr_size, qr_size), Image.Resampling.LANCZOS)
-        
-        qr_x = center_x - (qr_size // 2)
-        qr_y = int(height * 0.78)
-        certificate.paste(qr_img, (qr_x, qr_y))
-        print(f"✅ Added QR code")
-        
-        # Save
         output_path = f'static/certificates/{cert_id}.jpg'
-        certificate.save(output_path, 'JPEG', quality=95)
+        
+        # The renderer's canvas is shared, so only one render at a time
+        with _render_lock:
+            renderer = get_renderer(domain)
+            
+            # Check if template exists
+            if renderer is None:
+                print("❌ TEMPLATE NOT FOUND!")
+                print("⚠️  Please put it in static/templates/blank_certificate_template.jpg")
+                return None
+            
+            print(f"📐 Template size: {renderer.width}x{renderer.height}")
+            renderer.render(name, domain, start_date, end_date, cert_id, output_path)
+            hashes = renderer.region_hashes
         
         print(f"✅ SAVED: {output_path}")
+        store_region_hashes((cert_id, name, domain, start_date), hashes)
         print(f"{'='*80}\n")
         
         return output_path
@@ -174,151 +181,661 @@ def generate_certificate_image(name, domain, start_date, end_date, cert_id):
         traceback.print_exc()
         return None
 
-def get_certificate_url(cert_id):
-    """Get or generate certificate URL"""
+def save_region_hashes(conn, row, hashes):
+    """Record the region hashes of a rendered (id, name, domain, issue_date) row"""
+    import perceptual
+    perceptual.save_hashes(conn, row[0], certificate_version(*row), hashes)
+
+def store_region_hashes(row, hashes):
+    """save_region_hashes() in its own connection; a failure only costs a re-render later"""
+    try:
+        conn = db.connect()
+        with conn:
+            save_region_hashes(conn, row, hashes)
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"⚠️  Region hashes not saved for {row[0]}: {e}")
+
+def render_certificate(result, version=None):
+    """Render a certificate row now; True once its image (and region hashes) are written"""
+    cert_id, name, domain, issue_date = result
+    end_date = calculate_end_date(issue_date)
+    
+    # Cold renders are capped so they can't tie up every worker thread
+    with rate_limit.slot('render'):
+        if render_queue.consumers_running():
+            # The shared pool renders it once, however many workers ask
+            job = (cert_id, version or certificate_version(*result),
+                   name, domain, issue_date, end_date)
+            status = render_queue.render_and_wait(job, RENDER_WAIT)
+            if status is None:
+                raise rate_limit.Overloaded('render')
+            return status == 'done'
+        return generate_certificate_image(name, domain, issue_date, end_date, cert_id) is not None
+
+def image_is_current(cert_id, version):
+    """Whether the image on disk was rendered from the row with this fingerprint"""
+    return rendered_fingerprint(f'static/certificates/{cert_id}.jpg') == version
+
+def get_certificate_url(cert_id, version=None):
+    """Get or generate certificate URL (fingerprinted when version is given)"""
     cert_path = f'static/certificates/{cert_id}.jpg'
     
-    # Generate if doesn't exist
-    if not os.path.exists(cert_path):
-        conn = sqlite3.connect('certificates.db')
-        c = conn.cursor()
-        c.execute('SELECT name, domain, issue_date FROM certificates WHERE id=?', (cert_id,))
-        result = c.fetchone()
-        conn.close()
-        
-        if result:
-            name, domain, issue_date = result
-            end_date = "2025-08-19"
-            
-            cert_path = generate_certificate_image(name, domain, issue_date, end_date, cert_id)
-            if not cert_path:
-                return None
-        else:
+    # Generate if it doesn't exist, or (for fingerprinted URLs) was rendered from an older row
+    stale = not image_is_current(cert_id, version) if version else not os.path.exists(cert_path)
+    if stale:
+        result = fetch_certificate(cert_id)
+        if not result or not render_certificate(result, version):
             return None
     
     # Return URL
     base_url = get_base_url()
+    if version:
+        return f"{base_url}/certificates/{cert_id}.{version}.jpg"
     return f"{base_url}/static/certificates/{cert_id}.jpg"
 
+def render_job(job):
+    """Render one render_queue job (runs in the queue's consumer processes)"""
+    return generate_certificate_image(job['name'], job['domain'], job['start_date'],
+                                      job['end_date'], job['cert_id']) is not None
+
+def get_snapshot():
+    """In-memory certificates snapshot (None unless CERT_SNAPSHOT=1), reloaded after imports"""
+    global _snapshot, _snapshot_checked
+    if not CERT_SNAPSHOT:
+        return None
+    
+    if _snapshot is not None and time.monotonic() - _snapshot_checked < SNAPSHOT_REFRESH:
+        return _snapshot
+    
+    # One thread checks (and reloads); the others keep reading the current snapshot
+    if not _snapshot_lock.acquire(blocking=_snapshot is None):
+        return _snapshot
+    try:
+        if _snapshot is None or time.monotonic() - _snapshot_checked >= SNAPSHOT_REFRESH:
+            from snapshot import CertificateSnapshot
+            conn = db.connect()
+            try:
+                if _snapshot is None or db.data_version(conn) != _snapshot.version:
+                    _snapshot = CertificateSnapshot.load(conn)
+                    print(f"📸 Loaded snapshot of {len(_snapshot)} certificates (v{_snapshot.version})")
+            finally:
+                conn.close()
+            _snapshot_checked = time.monotonic()
+    finally:
+        _snapshot_lock.release()
+    return _snapshot
+
+def fetch_certificate(cert_id):
+    """Certificate row (id, name, domain, issue_date) or None"""
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return snapshot.get(cert_id)
+    
+    conn = db.connect()
+    c = conn.cursor()
+    c.execute(f'SELECT {db.DETAIL_COLUMNS} FROM certificate_details WHERE id=?', (cert_id,))
+    result = c.fetchone()
+    conn.close()
+    return result
+
+def certificate_payload(result, certificate_url):
+    """JSON body for a found certificate"""
+    cert_id, name, domain, issue_date = result
+    return {
+        'success': True,
+        'id': cert_id,
+        'name': name,
+        'domain': domain,
+        'issue_date': issue_date,
+        'certificate_url': certificate_url,
+        'verification_url': signing.verification_url(get_base_url(), cert_id, name, domain,
+                                                      issue_date, calculate_end_date(issue_date))
+    }
+
+def search_by_name(name):
+    """
+    First (id, name) whose name is or starts with name, or None. Anything
+    looser (a name in the middle, a typo) is left to fuzzy_candidates(),
+    which only suggests: it never scans every row on a miss.
+    """
+    key = db.name_key(name)
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return snapshot.find_name(key)
+    
+    conn = db.connect()
+    c = conn.cursor()
+    
+    # Exact and prefix matches both use the name_key index
+    c.execute('SELECT id, name FROM certificates WHERE name_key = ? LIMIT 1', (key,))
+    result = c.fetchone()
+    if not result:
+        c.execute("SELECT id, name FROM certificates WHERE name_key >= ? AND name_key < ? || char(1114111) LIMIT 1",
+                  (key, key))
+        result = c.fetchone()
+    conn.close()
+    return result
+
+def get_name_index():
+    """Fuzzy name index; built on first use, then topped up with new rows"""
+    global _name_index, _name_index_checked
+    from name_index import NameIndex
+    
+    now = time.monotonic()
+    with _name_index_lock:
+        if _name_index is None:
+            _name_index = NameIndex()
+            _name_index_checked = 0.0
+        if now - _name_index_checked >= NAME_INDEX_REFRESH:
+            # Inserts only ever append pks, so new names are the rows past last_pk
+            conn = db.connect()
+            rows = conn.execute('SELECT pk, name FROM certificates WHERE pk > ? ORDER BY pk',
+                                (_name_index.last_pk,))
+            _name_index.add_rows(db.iter_rows(rows))
+            conn.close()
+            _name_index_checked = now
+    return _name_index
+
+def fuzzy_candidates(name, limit=5):
+    """Ranked [{'id', 'name', 'score'}] for names close to name"""
+    matches = get_name_index().search(name, limit=limit, budget_ms=FUZZY_BUDGET_MS)
+    if not matches:
+        return []
+    
+    pks = [pk for pk, _ in matches]
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        by_pk = snapshot.by_pks(pks)
+    else:
+        conn = db.connect()
+        rows = conn.execute(f'SELECT pk, id, name FROM certificates WHERE pk IN ({",".join("?" * len(pks))})',
+                            pks).fetchall()
+        conn.close()
+        by_pk = {pk: (cert_id, cert_name) for pk, cert_id, cert_name in rows}
+    
+    return [{'id': by_pk[pk][0], 'name': by_pk[pk][1], 'score': score}
+            for pk, score in matches if pk in by_pk]
+
+def search_payload(name):
+    """
+    JSON body for a name search: a direct match, else fuzzy candidates.
+    Fuzzy hits are only ever suggestions (success False), never sent
+    straight to someone else's certificate however close the score.
+    """
+    result = search_by_name(name)
+    if result:
+        return {'success': True, 'id': result[0], 'name': result[1]}
+    
+    candidates = fuzzy_candidates(name)
+    payload = {'success': False, 'message': f'No certificate found for "{name}"',
+               'candidates': candidates}
+    if candidates:
+        payload['match'] = 'fuzzy'
+    return payload
+
+def encode_cursor(pk):
+    """Opaque keyset cursor for /api/certificates"""
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """pk from a cursor made by encode_cursor (ValueError if malformed)"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return int(base64.urlsafe_b64decode(padded.encode()).decode())
+
+def listing_item(row):
+    """JSON object for one db.list_certificates() row"""
+    return dict(zip(db.LIST_COLUMNS[1:], row[1:]))
+
+def open_upload(stream):
+    """Decode an uploaded JPEG/PNG as RGB (ValueError when it isn't one or is too big)"""
+    from PIL import Image, UnidentifiedImageError
+    
+    try:
+        image = Image.open(stream, formats=('JPEG', 'PNG'))
+    except UnidentifiedImageError:
+        raise ValueError('Upload a JPEG or PNG image')
+    if image.width * image.height > MAX_UPLOAD_PIXELS:
+        raise ValueError('Image is too large')
+    
+    # Phone photos decode at a reduced scale, still larger than the template
+    template = get_template_registry().get()
+    if template is not None:
+        image.draft('RGB', template.size)
+    try:
+        return image.convert('RGB')
+    except OSError:
+        raise ValueError('Image could not be decoded')
+
+class ForeignQRCode(ValueError):
+    """An upload's QR code doesn't point to one of our verification pages"""
+
+def identify_upload(qr_text, cert_id=None):
+    """
+    (cert_id, how, signed fields) for an upload from its QR code text, else
+    from the cert_id the client sent. Raises ForeignQRCode for a QR code
+    that isn't one of ours (another host, e.g. a fake "verified" page) and
+    signing.InvalidToken for a signed one that doesn't verify.
+    """
+    if qr_text:
+        url = urlsplit(qr_text.strip())
+        base = urlsplit(get_base_url())
+        if (url.scheme, url.netloc.lower()) != (base.scheme, base.netloc.lower()):
+            raise ForeignQRCode(f'The QR code points to {url.netloc or qr_text.strip()[:100]}, not this site')
+        path = unquote(url.path)
+        if path.startswith('/v/'):
+            signer = signing.get_signer()
+            if signer is None:
+                raise signing.InvalidToken('Signed verification is not enabled')
+            fields = signer.verify(path[len('/v/'):])
+            return fields['id'], 'signed-qr', fields
+        if path.startswith('/verify/'):
+            return path[len('/verify/'):], 'qr', None
+        raise ForeignQRCode('The QR code is not a certificate verification link')
+    if cert_id:
+        return cert_id, 'cert_id', None
+    return None, None, None
+
+def canonical_hashes(result):
+    """Region hashes of a certificate's current render; renders it if they are missing or stale"""
+    import perceptual
+    
+    version = certificate_version(*result)
+    conn = db.connect()
+    try:
+        stored = perceptual.load_hashes(conn, result[0])
+        if stored is None or stored[0] != version:
+            if not render_certificate(result, version):
+                return None
+            stored = perceptual.load_hashes(conn, result[0])
+    finally:
+        conn.close()
+    return stored[1] if stored and stored[0] == version else None
+
+def tamper_check_payload(image, cert_id=None):
+    """(JSON body, status) for /api/tamper-check on a decoded upload"""
+    import perceptual
+    
+    try:
+        cert_id, identified_by, signed = identify_upload(perceptual.decode_qr(image), cert_id)
+    except ForeignQRCode as e:
+        return {'success': True, 'verdict': 'tampered', 'identified_by': 'qr',
+                'message': str(e)}, 200
+    except signing.InvalidToken:
+        return {'success': True, 'verdict': 'tampered', 'identified_by': 'signed-qr',
+                'message': 'The QR code signature is invalid'}, 200
+    
+    result = fetch_certificate(cert_id) if cert_id else None
+    if cert_id and not result:
+        return {'success': False, 'message': 'Certificate not found', 'id': cert_id}, 404
+    
+    template = get_template_registry().for_domain(result[2] if result else None)
+    if template is None:
+        return {'success': False, 'message': 'Template not found'}, 500
+    
+    width, height = template.size
+    if abs(image.width / image.height - width / height) > UPLOAD_ASPECT_TOLERANCE * width / height:
+        return {'success': True, 'verdict': 'inconclusive', 'id': cert_id,
+                'message': 'Upload the whole certificate image, uncropped'}, 200
+    
+    image = image.resize(template.size) if image.size != template.size else image
+    hashes = perceptual.region_hashes(image, template)
+    
+    if result is None:
+        # No QR code or ID: look the certificate up by what its text looks like
+        conn = db.connect()
+        matches = perceptual.nearest(conn, hashes, limit=1)
+        conn.close()
+        if matches:
+            result = fetch_certificate(matches[0][1])
+        if result is None:
+            return {'success': False, 'message': 'Could not identify the certificate: send cert_id '
+                                                 'or an image with a readable QR code'}, 404
+        identified_by = 'region-hashes'
+        candidate = get_template_registry().for_domain(result[2])
+        if candidate is not template:
+            hashes = perceptual.region_hashes(image.resize(candidate.size), candidate)
+    
+    reference = canonical_hashes(result)
+    if reference is None:
+        return {'success': False, 'message': 'Failed to generate certificate'}, 500
+    
+    regions, verdict = perceptual.compare(hashes, reference)
+    cert_id, name, domain, issue_date = result
+    payload = {
+        'success': True,
+        'verdict': verdict,
+        'identified_by': identified_by,
+        'id': cert_id,
+        'name': name,
+        'domain': domain,
+        'issue_date': issue_date,
+        'regions': regions
+    }
+    if signed:
+        payload['signed'] = True
+    return payload, 200
+
+def admin_required(view):
+    """Require 'Authorization: Bearer <ADMIN_TOKEN>'"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return cached(json_response({'success': False, 'message': 'Admin routes are disabled (set ADMIN_TOKEN)'}, 403), 'no-cache')
+        
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+            response = json_response({'success': False, 'message': 'Unauthorized'}, 401)
+            response.headers['WWW-Authenticate'] = 'Bearer'
+            return cached(response, 'no-cache')
+        return view(*args, **kwargs)
+    return wrapper
+
 # ========== ROUTES ==========
 
-@app.route('/')
+@bp.route('/')
 def home():
-    return render_template('index.html')
+    return cached(render_template('index.html'), 'page')
 
-@app.route('/verify/<cert_id>')
+@bp.route('/verify/<cert_id>')
 def verify_certificate(cert_id):
     """Verification page - shows the AICTE approval"""
-    return render_template('verify.html', cert_id=cert_id)
+    return cached(render_template('verify.html', cert_id=cert_id), 'page')
+
+@bp.route('/v/<token>')
+def verify_signed_certificate(token):
+    """Verification page for a signed QR code (checked by /api/verify/<token>)"""
+    return cached(render_template('verify.html'), 'page')
 
-@app.route('/certificate/<cert_id>')
+@bp.route('/certificate/<cert_id>')
 def full_certificate(cert_id):
     """Full certificate view with download"""
-    return render_template('certificate.html', cert_id=cert_id)
+    return cached(render_template('certificate.html', cert_id=cert_id), 'page')
+
+@bp.route('/certificates/<cert_id>.<version>.jpg')
+@rate_limit.limited('verify')
+def certificate_image(cert_id, version):
+    """Fingerprinted certificate image, cacheable forever"""
+    result = fetch_certificate(cert_id)
+    
+    if not result:
+        return cached(('Certificate not found', 404), 'no-cache')
+    
+    current = certificate_version(*result)
+    if version != current:
+        # Old link: send the client to the current image, without caching the hop
+        return cached(redirect(get_certificate_url(cert_id, current)), 'no-cache')
+    
+    # Never label an image rendered from an older row as immutable
+    if not get_certificate_url(cert_id, current):
+        return cached(('Failed to generate certificate', 500), 'no-cache')
+    
+    response = send_from_directory('static/certificates', f'{cert_id}.jpg',
+                                   max_age=POLICIES['immutable']['max_age'])
+    return cached(response, 'immutable', etag=version)
 
-@app.route('/api/certificate/<cert_id>')
+@bp.route('/api/certificate/<cert_id>')
+@rate_limit.limited('verify')
 def get_certificate(cert_id):
     """Get certificate details by ID"""
-    conn = sqlite3.connect('certificates.db')
-    c = conn.cursor()
-    c.execute('SELECT * FROM certificates WHERE id=?', (cert_id,))
-    result = c.fetchone()
-    conn.close()
+    result = fetch_certificate(cert_id)
     
     if result:
-        certificate_url = get_certificate_url(cert_id)
+        # Repeat scans end here, before the image is even looked at
+        version = certificate_version(*result)
+        unchanged = not_modified(version, 'api')
+        if unchanged:
+            return unchanged
+        
+        certificate_url = get_certificate_url(cert_id, version)
         if not certificate_url:
-            return jsonify({'success': False, 'message': 'Failed to generate certificate'})
+            return cached(json_response({'success': False, 'message': 'Failed to generate certificate'}), 'no-cache')
         
-        return jsonify({
-            'success': True,
-            'id': result[0],
-            'name': result[1],
-            'domain': result[2],
-            'issue_date': result[3],
-            'certificate_url': certificate_url
-        })
+        return cached(json_response(certificate_payload(result, certificate_url)),
+                      'api', etag=version)
     else:
-        return jsonify({'success': False, 'message': 'Certificate not found'})
+        return cached(json_response({'success': False, 'message': 'Certificate not found'}), 'no-cache')
+
+@bp.route('/api/verify/<token>')
+@rate_limit.limited('verify')
+def verify_token(token):
+    """Validate a signed verification token without touching the database"""
+    signer = signing.get_signer()
+    if signer is None:
+        return cached(json_response({'success': False, 'message': 'Signed verification is not enabled'}), 'no-cache')
+    
+    try:
+        fields = signer.verify(token)
+    except signing.InvalidToken:
+        return cached(json_response({'success': False, 'message': 'Invalid certificate signature'}), 'no-cache')
+    
+    # A token's answer only changes if the key is rotated
+    return cached(json_response({'success': True, 'signed': True, **fields}), 'api',
+                  etag=token.rsplit('.', 1)[1])
+
+@bp.route('/api/tamper-check', methods=['POST'])
+@rate_limit.limited('upload', concurrency='upload')
+def tamper_check():
+    """
+    Check an uploaded certificate image against the certificate it claims to be.
+    
+    multipart/form-data: image=<JPEG or PNG>, optionally cert_id (used when
+    the QR code can't be read). Compares perceptual hashes of the name,
+    domain and dates regions with the ones stored for our render.
+    """
+    upload = request.files.get('image')
+    if upload is None:
+        return cached(json_response({'success': False, 'message': 'Upload the certificate as "image"'}, 400), 'no-cache')
+    
+    started = time.perf_counter()
+    try:
+        image = open_upload(upload.stream)
+    except ValueError as e:
+        return cached(json_response({'success': False, 'message': str(e)}, 400), 'no-cache')
+    
+    payload, status = tamper_check_payload(image, request.form.get('cert_id', '').strip() or None)
+    print(f"🕵️  Tamper check {payload.get('id', '?')}: {payload.get('verdict', 'failed')} "
+          f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+    return cached(json_response(payload, status), 'no-cache')
 
-@app.route('/api/search')
+@bp.route('/api/search')
+@rate_limit.limited('search', concurrency='search')
 def search_certificate():
     """Search certificate by name"""
     name = request.args.get('name', '').strip().upper()
     
     if not name:
-        return jsonify({'success': False, 'message': 'Name required'})
+        return json_response({'success': False, 'message': 'Name required'})
     
-    conn = sqlite3.connect('certificates.db')
-    c = conn.cursor()
-    c.execute('SELECT id, name FROM certificates WHERE UPPER(name) LIKE ?', (f'%{name}%',))
-    result = c.fetchone()
+    return json_response(search_payload(name))
+
+@bp.route('/api/certificates')
+@rate_limit.limited('listing')
+def list_certificates():
+    """
+    List certificates, filtered by domain, start date range and name prefix.
+    
+    ?domain=&from=YYYY-MM-DD&to=YYYY-MM-DD&name=PREFIX&limit=N&cursor=C
+    Pages with next_cursor; ?format=ndjson streams every match instead.
+    """
+    filters = {
+        'domain': request.args.get('domain', '').strip() or None,
+        'name_prefix': request.args.get('name', '').strip() or None,
+    }
+    for arg, key in (('from', 'date_from'), ('to', 'date_to')):
+        value = request.args.get(arg, '').strip()
+        filters[key] = db.parse_date(value) if value else None
+        if value and not filters[key]:
+            return json_response({'success': False, 'message': f'Invalid {arg} date, use YYYY-MM-DD'}, 400)
+    
+    try:
+        after_pk = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        return json_response({'success': False, 'message': 'Invalid cursor or limit'}, 400)
+    if limit < 1:
+        return json_response({'success': False, 'message': 'Invalid cursor or limit'}, 400)
+    
+    if request.args.get('format') == 'ndjson':
+        def export():
+            conn = db.connect()
+            try:
+                # Page by page, so a slow client doesn't hold a read lock writers wait on
+                for row in db.iter_list_paged(conn, after_pk=after_pk, **filters):
+                    yield dumps(listing_item(row)) + b'\n'
+            finally:
+                conn.close()
+        
+        return Response(stream_with_context(export()), mimetype='application/x-ndjson')
+    
+    conn = db.connect()
+    # One extra row tells us whether there is a next page
+    rows = db.list_certificates(conn, after_pk=after_pk, limit=limit + 1, **filters).fetchall()
     conn.close()
     
-    if result:
-        return jsonify({'success': True, 'id': result[0], 'name': result[1]})
-    else:
-        return jsonify({'success': False, 'message': f'No certificate found for "{name}"'})
+    next_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+    return json_response({
+        'success': True,
+        'certificates': [listing_item(row) for row in rows[:limit]],
+        'next_cursor': next_cursor
+    })
 
-@app.route('/api/regenerate-all')
+@bp.route('/api/regenerate-all', methods=['POST'])
+@rate_limit.limited('admin', concurrency='regenerate')
+@admin_required
 def regenerate_all_certificates():
-    """Regenerate all certificates with correct QR codes"""
+    """Regenerate all certificates with correct QR codes (admin, POST)"""
     print("\n" + "="*80)
     print("🔄 REGENERATING ALL CERTIFICATES")
     print(f"🌐 Base URL: {get_base_url()}")
     print("="*80 + "\n")
     
+    from rendering import render_batch
+    
     # Check template
-    if not os.path.exists('static/templates/blank_certificate_template.jpg'):
+    if get_template_registry().get() is None:
         return jsonify({
             'success': False,
             'message': 'Template not found! Run setup first.'
         })
     
+    if render_queue.consumers_running():
+        return queue_regeneration()
+    
     # Delete old certificates
     if os.path.exists('static/certificates'):
-        for file in os.listdir('static/certificates'):
-            if file.endswith('.jpg'):
-                os.remove(f'static/certificates/{file}')
-                print(f"🗑️  Deleted old: {file}")
+        with os.scandir('static/certificates') as entries:
+            for entry in entries:
+                if entry.name.endswith(('.jpg', '.fp')):
+                    os.remove(entry.path)
+                    print(f"🗑️  Deleted old: {entry.name}")
     
-    # Generate all
-    conn = sqlite3.connect('certificates.db')
-    c = conn.cursor()
-    c.execute('SELECT id, name, domain, issue_date FROM certificates')
-    results = c.fetchall()
-    conn.close()
+    # Stream rows in pages through one renderer instead of fetchall(); each
+    # page is read whole, so the hash commits below never wait on the reader
+    conn = db.connect()
+    hashes_conn = db.connect()
+    saved = 0
     
-    generated = []
-    failed = []
+    def on_rendered(row, hashes):
+        nonlocal saved
+        save_region_hashes(hashes_conn, row, hashes)
+        saved += 1
+        # Short write transactions, so other workers' writes don't time out meanwhile
+        if saved % HASHES_COMMIT_EVERY == 0:
+            hashes_conn.commit()
     
-    for cert in results:
-        cert_id, name, domain, issue_date = cert
-        
-        try:
-            start = datetime.strptime(issue_date, '%Y-%m-%d')
-            end = start + timedelta(days=127)
-            end_date = end.strftime('%Y-%m-%d')
-        except:
-            end_date = "2026-03-31"
-        
-        cert_path = generate_certificate_image(name, domain, issue_date, end_date, cert_id)
-        
-        if cert_path:
-            generated.append(cert_id)
-        else:
-            failed.append(cert_id)
+    with _render_lock:
+        summary = render_batch(db.iter_details_paged(conn), get_renderer, 'static/certificates',
+                               calculate_end_date, on_rendered=on_rendered)
+    hashes_conn.commit()
+    hashes_conn.close()
+    conn.close()
+    
+    generated = summary['generated']
+    failed = summary['failed']
     
-    print(f"\n✅ Generated: {len(generated)} | ❌ Failed: {len(failed)}\n")
+    print(f"\n✅ Generated: {generated} | ❌ Failed: {len(failed)}")
+    print(f"📈 Peak memory: {summary['peak_rss_mb']} MB (started at {summary['start_rss_mb']} MB)\n")
     
     return jsonify({
         'success': True,
-        'message': f'Generated {len(generated)}, Failed {len(failed)}',
+        'message': f'Generated {generated}, Failed {len(failed)}',
         'generated': generated,
         'failed': failed,
+        'peak_rss_mb': summary['peak_rss_mb'],
+        'start_rss_mb': summary['start_rss_mb'],
+        'batch_peak': summary['batch_peak'],
         'base_url': get_base_url()
     })
 
+def queue_regeneration():
+    """Queue every certificate for the render pool at batch priority"""
+    conn = db.connect()
+    c = conn.cursor()
+    c.execute(f'SELECT {db.DETAIL_COLUMNS} FROM certificate_details ORDER BY pk')
+    jobs = ((cert_id, certificate_version(cert_id, name, domain, issue_date),
+             name, domain, issue_date, calculate_end_date(issue_date))
+            for cert_id, name, domain, issue_date in db.iter_rows(c))
+    
+    # Existing images keep being served until their re-render replaces them
+    queue = render_queue.connect()
+    queued = render_queue.enqueue_many(queue, jobs, priority=render_queue.BATCH)
+    queue.close()
+    conn.close()
+    
+    print(f"📥 Queued {queued} certificates for regeneration\n")
+    
+    return jsonify({
+        'success': True,
+        'message': f'Queued {queued} certificates',
+        'queued': queued,
+        'base_url': get_base_url()
+    }), 202
+
+@bp.route('/api/render-queue')
+@admin_required
+def render_queue_status():
+    """Render queue job counts (admin)"""
+    queue = render_queue.connect()
+    summary = render_queue.stats(queue)
+    queue.close()
+    return cached(json_response({'success': True, **summary}), 'no-cache')
+
+# ========== APP FACTORY ==========
+
+def warmup(app):
+    """Get a worker ready before it accepts traffic"""
+    # Create necessary directories
+    os.makedirs('static/certificates', exist_ok=True)
+    os.makedirs('static/templates', exist_ok=True)
+    
+    init_db()
+    get_snapshot()
+    get_name_index()
+    
+    if WARMUP_RENDERER:
+        # Decodes templates, loads fonts and imports PIL/qrcode up front
+        get_renderer()
+    
+    compression.precompress(app, WARM_PAGES)
+    print("🔥 Warmup complete")
+
+def create_app(warm=True):
+    """Build the Flask app; warm=True runs warmup() before returning it"""
+    app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+    CORS(app, resources={r'/api/*': {'origins': allowed_origins()}})
+    rate_limit.init_app(app)
+    compression.init_app(app)
+    app.register_blueprint(bp)
+    
+    if warm:
+        warmup(app)
+    return app
+
+# gunicorn app:app (see gunicorn.conf.py for preloading)
+app = create_app()
+
 if __name__ == '__main__':
     print("\n" + "="*80)
     print("🏢 NXTSYNC CERTIFICATE VERIFICATION SYSTEM")
@@ -333,23 +850,20 @@ if __name__ == '__main__':
     print(f"🔗 Base URL: {get_base_url()}")
     
     # Check template
-    if not os.path.exists('static/templates/blank_certificate_template.jpg'):
+    if get_template_registry().get() is None:
         print("\n⚠️  WARNING: Template not found!")
-        print("📝 Please run setup first:")
-        print("    python setup_certificate.py")
+        print("📝 Put it in static/templates/blank_certificate_template.jpg")
         print("="*80 + "\n")
     else:
         print("\n✅ Template found - ready to generate!")
         print("="*80 + "\n")
     
-    init_db()
-    
     PORT = int(os.environ.get('PORT', 5000))
     is_production = os.environ.get('RENDER', False)
     
     if not is_production:
         print(f"🌐 URL: http://192.168.0.66:{PORT}")
-        print(f"🔄 Regenerate: http://192.168.0.66:{PORT}/api/regenerate-all")
+        print(f"🔄 Regenerate: curl -X POST -H 'Authorization: Bearer $ADMIN_TOKEN' http://192.168.0.66:{PORT}/api/regenerate-all")
         print(f"🔎 Try searching: DODDA YUVARATNA")
         print("\n" + "="*80 + "\n")
         
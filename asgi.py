@@ -0,0 +1,260 @@
+"""
+NXTSYNC ASYNC (ASGI) SERVING MODE
+=================================
+Optional entry point that serves /api/certificate/<id> and /api/search
+with async handlers and hands every other route to the Flask app.
+
+- Database reads run on a small thread pool, so the event loop never
+  blocks on SQLite.
+- Missing certificate images are rendered in a process pool, so one slow
+  lazy render no longer holds up other verifications. When the shared
+  render queue (render_queue.py) is running, requests just wait on it.
+
+Run it with uvicorn workers under gunicorn (see render.yaml):
+
+    gunicorn asgi:application -k uvicorn_worker.UvicornWorker -w 2 \\
+        --bind 0.0.0.0:$PORT
+
+or for local testing:
+
+    uvicorn asgi:application --port 5000
+
+Pool sizes come from ASYNC_DB_THREADS (default 8) and
+ASYNC_RENDER_PROCESSES (default 1) per worker. Rate limits, concurrency
+caps and CORS origins are the same as in the Flask app (rate_limit.py).
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs
+import asyncio
+import contextvars
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+
+import app as flask_app
+import compression
+import rate_limit
+import render_queue
+from fast_json import dumps
+from http_cache import cache_control_value
+
+DB_THREADS = int(os.environ.get('ASYNC_DB_THREADS', 8))
+RENDER_PROCESSES = int(os.environ.get('ASYNC_RENDER_PROCESSES', 1))
+
+CERTIFICATE_PREFIX = '/api/certificate/'
+SEARCH_PATH = '/api/search'
+
+_db_executor = ThreadPoolExecutor(DB_THREADS, thread_name_prefix='db')
+_render_executor = None
+
+wsgi_application = WsgiToAsgi(flask_app.app)
+
+
+def get_render_executor():
+    """Process pool for CPU-bound renders, started on first use"""
+    global _render_executor
+    if _render_executor is None:
+        _render_executor = ProcessPoolExecutor(RENDER_PROCESSES)
+    return _render_executor
+
+
+async def run_db(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, func, *args)
+
+
+async def run_render(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_render_executor(), func, *args)
+
+
+def _headers(scope):
+    return {key.decode('latin-1').lower(): value.decode('latin-1')
+            for key, value in scope['headers']}
+
+
+def _accepted_encoding(headers):
+    """Preferred content coding from Accept-Encoding ('br', 'gzip' or None)"""
+    accepted = {}
+    for part in headers.get('accept-encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    if compression.brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def _cors_headers(headers):
+    """Mirror the Flask app's CORS policy (allowed origins only)"""
+    origin = headers.get('origin')
+    if origin and origin in flask_app.allowed_origins():
+        return [(b'access-control-allow-origin', origin.encode('latin-1')),
+                (b'vary', b'Origin')]
+    return []
+
+
+def _client(scope, headers):
+    remote_addr = scope['client'][0] if scope.get('client') else None
+    return rate_limit.client_address(remote_addr, headers.get('x-forwarded-for'))
+
+
+async def send_error(send, headers, error):
+    """429/503 for a RateLimited or Overloaded error"""
+    status, payload, retry_after = rate_limit.error_payload(error)
+    body = dumps(payload)
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'cache-control', cache_control_value('no-cache').encode()),
+        (b'retry-after', str(retry_after).encode()),
+        (b'content-length', str(len(body)).encode()),
+    ] + _cors_headers(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _client_has(headers, etag):
+    if_none_match = headers.get('if-none-match', '')
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return any(f'"{etag}{suffix}"' in tags
+               for suffix in ('',) + compression.ETAG_SUFFIXES)
+
+
+async def send_json(send, headers, payload, policy, etag=None, status=200):
+    """Send a JSON response with the same caching and compression as Flask"""
+    body = dumps(payload)
+    response_headers = [
+        (b'content-type', b'application/json'),
+        (b'vary', b'Accept-Encoding'),
+    ] + _cors_headers(headers)
+    if policy:
+        response_headers.append((b'cache-control', cache_control_value(policy).encode()))
+
+    encoding = _accepted_encoding(headers) if len(body) >= compression.MIN_SIZE else None
+    if encoding:
+        body = compression.compress(body, encoding)
+        response_headers.append((b'content-encoding', encoding.encode()))
+    if etag:
+        tag = f'{etag}-{encoding}' if encoding else etag
+        response_headers.append((b'etag', f'"{tag}"'.encode()))
+
+    response_headers.append((b'content-length', str(len(body)).encode()))
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': response_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_not_modified(send, headers, etag, policy):
+    await send({'type': 'http.response.start', 'status': 304, 'headers': [
+        (b'etag', f'"{etag}"'.encode()),
+        (b'cache-control', cache_control_value(policy).encode()),
+        (b'vary', b'Accept-Encoding'),
+    ] + _cors_headers(headers)})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def certificate_endpoint(scope, send, cert_id):
+    """Async /api/certificate/<cert_id>"""
+    headers = _headers(scope)
+    try:
+        await run_db(rate_limit.check, 'verify', _client(scope, headers))
+    except rate_limit.RateLimited as e:
+        await send_error(send, headers, e)
+        return
+
+    result = await run_db(flask_app.fetch_certificate, cert_id)
+    if not result:
+        await send_json(send, headers,
+                        {'success': False, 'message': 'Certificate not found'}, 'no-cache')
+        return
+
+    version = flask_app.certificate_version(*result)
+    if _client_has(headers, version):
+        await send_not_modified(send, headers, version, 'api')
+        return
+
+    if flask_app.image_is_current(cert_id, version):
+        certificate_url = flask_app.get_certificate_url(cert_id, version)
+    else:
+        # Render off the event loop and out of this process; with the shared
+        # render queue running this only waits, so a thread will do
+        try:
+            if await run_db(render_queue.consumers_running):
+                certificate_url = await run_db(flask_app.get_certificate_url, cert_id, version)
+            else:
+                certificate_url = await run_render(flask_app.get_certificate_url, cert_id, version)
+        except rate_limit.Overloaded as e:
+            await send_error(send, headers, e)
+            return
+
+    if not certificate_url:
+        await send_json(send, headers,
+                        {'success': False, 'message': 'Failed to generate certificate'},
+                        'no-cache')
+        return
+
+    await send_json(send, headers, flask_app.certificate_payload(result, certificate_url),
+                    'api', etag=version)
+
+
+async def search_endpoint(scope, send):
+    """Async /api/search?name=..."""
+    headers = _headers(scope)
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    name = query.get('name', [''])[0].strip().upper()
+
+    if not name:
+        await send_json(send, headers, {'success': False, 'message': 'Name required'}, None)
+        return
+
+    try:
+        await run_db(rate_limit.check, 'search', _client(scope, headers))
+        with rate_limit.slot('search'):
+            payload = await run_db(flask_app.search_payload, name)
+    except (rate_limit.RateLimited, rate_limit.Overloaded) as e:
+        await send_error(send, headers, e)
+        return
+
+    await send_json(send, headers, payload, None)
+
+
+async def lifespan(receive, send):
+    """Shut the executors down with the worker so no render process outlives it"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _render_executor is not None:
+                _render_executor.shutdown(wait=False, cancel_futures=True)
+            _db_executor.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        path = scope['path']
+        cert_id = path[len(CERTIFICATE_PREFIX):]
+        if path.startswith(CERTIFICATE_PREFIX) and cert_id and '/' not in cert_id:
+            await certificate_endpoint(scope, send, cert_id)
+            return
+        if path == SEARCH_PATH:
+            await search_endpoint(scope, send)
+            return
+
+    # asgiref keeps per-request state in context variables, and a keep-alive
+    # connection's requests share one context, so every other request
+    # failed under load; give each its own empty context
+    await asyncio.get_running_loop().create_task(
+        wsgi_application(scope, receive, send), context=contextvars.Context())
@@ -1,332 +1,422 @@
 """
-NXTSYNC CERTIFICATE GENERATOR - FIXED VERSION
-==============================================
-NOW SAVES TO static/certificates/ TO MATCH app.py!
+NXTSYNC CERTIFICATE GENERATOR
+=============================
+Non-interactive batch generator. Streams students from certificates.db
+(or a CSV / JSONL file), renders them into static/certificates/ with N
+worker processes and records progress in a checkpoint so an interrupted
+run picks up where it stopped.
+
+    python certificate_generator.py                       # everything in the DB
+    python certificate_generator.py --source students.csv --workers 4
+    python certificate_generator.py --only-changed --limit 500
+    python certificate_generator.py --dry-run
+    python certificate_generator.py --export-urls urls.csv   # QR URLs only
+
+With CERT_SIGNING_KEY set the QR codes carry signed tokens (see signing.py).
+When the source is a database, the region hashes of every render are
+stored in it for tamper checks (see perceptual.py).
 """
 
-from PIL import Image, ImageDraw, ImageFont
-import qrcode
-from datetime import datetime, timedelta
+from itertools import islice
+import argparse
+import csv
+import json
 import os
 import sys
 
-# ========== CONFIGURATION ==========
-# Try multiple possible template names
-POSSIBLE_TEMPLATES = [
-    'static/templates/blank_certificate_template.jpg',
-    'static/templates/template.jpg',
-    'template.jpg', 
-    'template.png'
-]
+import db
+import perceptual
+from fingerprints import certificate_fingerprint
+from rendering import CertificateRenderer
+from signing import get_signer
+from template_registry import MANIFEST_PATH, TemplateRegistry, find_template
 
+# ========== CONFIGURATION ==========
 # FIXED: Changed to match app.py's expected folder
 OUTPUT_FOLDER = 'static/certificates'
 
-# Text positions (percentages of image height)
-POSITIONS = {
-    'name_y': 0.515,
-    'name_underline': 0.57,
-    'text1_y': 0.633,
-    'domain_y': 0.673,
-    'text2_y': 0.712,
-    'qr_y': 0.78
-}
-
-# Colors matching your certificate
-COLORS = {
-    'name': (184, 134, 86),       # Gold/tan for name
-    'text': (0, 0, 0),            # Black for text
-    'underline': (128, 128, 128)  # Gray for underline
-}
-
-# Font sizes
-FONT_SIZES = {
-    'name': 60,
-    'domain': 26,
-    'text': 19
-}
-
-# ========== DATABASE ==========
-STUDENTS = [
-    {
-        'id': 'CERT001',
-        'name': 'PULLABHOTLA VENKATARAMA SASTRY',
-        'domain': 'Full Stack Web Development',
-        'start_date': '2025-05-19'
-    },
-    {
-        'id': 'CERT002',
-        'name': 'kovuru Praneeth',
-        'domain': 'Full Stack Web Development',
-        'start_date': '2025-05-19'
-    },
-    {
-        'id': 'CERT003',
-        'name': 'DODDA YUVARATNA',
-        'domain': 'Full Stack Web Development',
-        'start_date': '2025-05-19'
-    },
-    {
-        'id': 'CERT004',
-        'name': 'GOTTEMUKKALA KEERTHI',
-        'domain': 'Full Stack Web Development',
-        'start_date': '2025-05-19'
-    },
-    {
-        'id': 'CERT005',
-        'name': 'TATIPAKALA VINEELA',
-        'domain': 'Full Stack Web Development',
-        'start_date': '2025-05-19'
-    },
-    {
-        'id': 'CERT006',
-        'name': 'CHEGIREDDY KARTHEEK REDDY',
-        'domain': 'Full Stack Web Development',
-        'start_date': '2025-05-19'
-    },
-    {
-        'id': 'CERT007',
-        'name': 'SINGAMPALLI UMA JAYA SREE',
-        'domain': 'Full Stack Web Development',
-        'start_date': '2025-05-19'
-    },
-    {
-        'id': 'CERT008',
-        'name': 'MANDALAPU MARUTHI SAI KRISHNA',
-        'domain': 'Full Stack Web Development',
-        'start_date': '2025-05-19'
-    },
-]
+DEFAULT_SOURCE = 'certificates.db'
+DEFAULT_CHECKPOINT = 'static/certificates/.generator_checkpoint.json'
+DEFAULT_BASE_URL = "https://certificate-verification-system-3.onrender.com"
 
-# ========== FUNCTIONS ==========
+# Tasks handed to the worker pool at a time, so big sources stay streamed
+FEED_BATCH = 100
 
-def find_template():
-    """Find the template file"""
-    print("🔍 Looking for template file...")
-    
-    current_dir = os.getcwd()
-    print(f"📁 Current directory: {current_dir}")
-    
-    # Try predefined paths first
-    for template_path in POSSIBLE_TEMPLATES:
-        if os.path.exists(template_path):
-            print(f"✅ Found template: {template_path}")
-            return template_path
-    
-    # Search in common locations
-    search_locations = [
-        'static/templates',
-        'templates',
-        '.'
-    ]
-    
-    for location in search_locations:
-        if os.path.exists(location):
-            for file in os.listdir(location):
-                if file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    if 'template' in file.lower() or 'certificate' in file.lower():
-                        full_path = os.path.join(location, file)
-                        print(f"✅ Found possible template: {full_path}")
-                        return full_path
-    
-    return None
-
-def load_fonts():
-    """Load fonts for the certificate"""
-    try:
-        # Try Windows fonts first
-        name_font = ImageFont.truetype("C:\\Windows\\Fonts\\georgiai.ttf", FONT_SIZES['name'])
-        domain_font = ImageFont.truetype("C:\\Windows\\Fonts\\arialbd.ttf", FONT_SIZES['domain'])
-        text_font = ImageFont.truetype("C:\\Windows\\Fonts\\arial.ttf", FONT_SIZES['text'])
-        print("✅ Loaded Windows fonts")
-        return name_font, domain_font, text_font
-    except:
-        try:
-            # Try Linux fonts
-            name_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSerif-Italic.ttf", 
-                                           FONT_SIZES['name'])
-            domain_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 
-                                             FONT_SIZES['domain'])
-            text_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 
-                                           FONT_SIZES['text'])
-            print("✅ Loaded Linux fonts")
-            return name_font, domain_font, text_font
-        except:
-            print("⚠️  Using default fonts")
-            default = ImageFont.load_default()
-            return default, default, default
-
-def create_qr_code(cert_id, base_url="https://certificate-verification-system-3.onrender.com"):
-
-    """Generate QR code for verification"""
-    verification_url = f"{base_url}/verify/{cert_id}"
-    qr = qrcode.QRCode(version=1, box_size=10, border=2)
-    qr.add_data(verification_url)
-    qr.make(fit=True)
-    return qr.make_image(fill_color="black", back_color="white")
+# Renders per region-hash commit; keeps the write lock on the DB short
+HASHES_COMMIT_EVERY = 20
+
+# ========== FUNCTIONS ==========
 
 def calculate_end_date(start_date_str):
     """Calculate end date (fixed to 2025-08-19)"""
     return start_date_str, "2025-08-19"
 
-def generate_certificate(student_data, template_path, output_folder):
-    """Generate certificate for one student"""
+# ========== STUDENT SOURCES ==========
+
+def _student(cert_id, name, domain, start_date):
+    return {
+        'id': cert_id,
+        'name': name,
+        'domain': domain,
+        'start_date': start_date
+    }
+
+def iter_students_from_db(path, read_only=False):
+    """
+    Stream students from the certificates table used by app.py. read_only
+    (dry runs, URL exports) opens the file without migrating it.
+    """
+    conn = db.connect(path, read_only=read_only)
     try:
-        cert_id = student_data['id']
-        name = student_data['name']
-        domain = student_data['domain']
-        start_date = student_data['start_date']
-        
-        print(f"\n{'='*70}")
-        print(f"🎨 Generating: {name}")
-        print(f"   Domain: {domain}")
-        print(f"   Start: {start_date}")
-        
-        # Open template
-        certificate = Image.open(template_path).convert('RGB')
-        draw = ImageDraw.Draw(certificate)
-        width, height = certificate.size
-        
-        print(f"   Template size: {width}x{height}")
-        
-        # Load fonts
-        name_font, domain_font, text_font = load_fonts()
-        
-        # Calculate dates
-        start_str, end_str = calculate_end_date(start_date)
-        print(f"   Period: {start_str} to {end_str}")
-        
-        center_x = width // 2
-        
-        # ========== 1. DRAW NAME (Italic, Gold) ==========
-        name_y = int(height * POSITIONS['name_y'])
-        draw.text((center_x, name_y), name, 
-                  fill=COLORS['name'], font=name_font, anchor="mm")
-        
-        # Draw underline
-        underline_y = int(height * POSITIONS['name_underline'])
-        underline_length = 300
-        draw.line([center_x - underline_length, underline_y,
-                   center_x + underline_length, underline_y],
-                  fill=COLORS['underline'], width=2)
-        
-        # ========== 2. DRAW TEXT LINE 1 ==========
-        text1_y = int(height * POSITIONS['text1_y'])
-        text1 = "has successfully completed the internship "
-        draw.text((center_x, text1_y), text1, 
-                  fill=COLORS['text'], font=text_font, anchor="mm")
-        
-        # ========== 3. DRAW DOMAIN (Bold) ==========
-        domain_y = int(height * POSITIONS['domain_y'])
-        draw.text((center_x, domain_y), domain,
-                  fill=COLORS['text'], font=domain_font, anchor="mm")
-        
-        # ========== 4. DRAW TEXT LINE 2 ==========
-        text2_y = int(height * POSITIONS['text2_y'])
-        text2 = f"conducted by Nxtsync from {start_str} to {end_str}."
-        draw.text((center_x, text2_y), text2,
-                  fill=COLORS['text'], font=text_font, anchor="mm")
-        
-        # ========== 5. ADD QR CODE ==========
-        qr_img = create_qr_code(cert_id)
-        qr_size = 140
-        qr_img = qr_img.resize((qr_size, qr_size), Image.Resampling.LANCZOS)
-        
-        qr_x = center_x - (qr_size // 2)
-        qr_y = int(height * POSITIONS['qr_y'])
-        certificate.paste(qr_img, (qr_x, qr_y))
-        
-        # ========== 6. SAVE ==========
-        # FIXED: Save with just CERT ID (matching app.py expectations)
-        output_path = os.path.join(output_folder, f'{cert_id}.jpg')
-        certificate.save(output_path, 'JPEG', quality=95)
-        
-        print(f"✅ Saved: {output_path}")
-        print(f"{'='*70}")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ ERROR: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+        if not read_only:
+            db.migrate(conn)
+        if db.schema_version(conn) < 2:
+            # Never migrated: the original single table
+            rows = db.iter_rows(conn.execute('SELECT id, name, domain, issue_date FROM certificates'))
+        else:
+            # Paged, so region hashes can be committed to the same file mid-run
+            rows = db.iter_details_paged(conn)
+        for cert_id, name, domain, issue_date in rows:
+            yield _student(cert_id, name, domain, issue_date)
+    finally:
+        conn.close()
 
-def main():
-    """Main function"""
-    print("\n" + "="*70)
-    print("🎓 NXTSYNC CERTIFICATE GENERATOR")
-    print("="*70 + "\n")
-    
-    # Create required folders
-    os.makedirs('static/templates', exist_ok=True)
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    
-    # Find template
-    template_path = find_template()
-    
-    if not template_path:
-        print("\n❌ ERROR: No template file found!")
-        print("\n📋 WHAT TO DO:")
-        print("   1. Save your blank certificate template image")
-        print("   2. Put it in: static/templates/")
-        print("   3. Name it: blank_certificate_template.jpg")
-        print("   4. Run this script again")
-        print("\n" + "="*70 + "\n")
-        input("Press ENTER to exit...")
-        return
-    
-    # Load and check template
+def iter_students_from_csv(path):
+    """Stream students from a CSV with id,name,domain,start_date columns"""
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield _student(row['id'], row['name'], row['domain'],
+                           row.get('start_date') or row.get('issue_date', ''))
+
+def iter_students_from_jsonl(path):
+    """Stream students from a JSONL file, one object per line"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            yield _student(row['id'], row['name'], row['domain'],
+                           row.get('start_date') or row.get('issue_date', ''))
+
+def is_database(source):
+    return os.path.splitext(source)[1].lower() not in ('.csv', '.jsonl', '.ndjson')
+
+def iter_students(source, read_only=False):
+    """Pick the reader for source based on its extension"""
+    ext = os.path.splitext(source)[1].lower()
+    if ext == '.csv':
+        return iter_students_from_csv(source)
+    if ext in ('.jsonl', '.ndjson'):
+        return iter_students_from_jsonl(source)
+    return iter_students_from_db(source, read_only)
+
+# ========== CHECKPOINT ==========
+
+class Checkpoint:
+    """
+    Fingerprints of the last successful render per certificate.
+
+    The manifest (path) is only rewritten when a run finishes, i.e. has
+    gone through the whole source (iter_tasks sets source_exhausted; a run
+    cut short by --limit hasn't). While a run is in progress every render
+    is appended to path + '.partial'; if that journal exists at start-up
+    the previous run was interrupted or limited and the IDs in it are
+    skipped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = path + '.partial'
+        self.rendered = {}
+        self.interrupted = set()
+        self.source_exhausted = False
+        self._journal = None
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.rendered = json.load(f)
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    self.rendered[entry['id']] = entry['fp']
+                    self.interrupted.add(entry['id'])
+
+    def is_current(self, cert_id, fingerprint):
+        return self.rendered.get(cert_id) == fingerprint
+
+    def open(self):
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def record(self, cert_id, fingerprint):
+        self.rendered[cert_id] = fingerprint
+        self._journal.write(json.dumps({'id': cert_id, 'fp': fingerprint}) + '\n')
+        self._journal.flush()
+
+    def close(self, finished):
+        """Close the journal; fold it into the manifest if the run finished"""
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+        if not finished:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.rendered, f)
+        os.replace(tmp_path, self.path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+# ========== RENDERING ==========
+
+_worker_registry = None
+_worker_renderers = {}
+_worker_base_url = None
+
+def _init_worker(template_path, manifest_path, base_url):
+    """Pool initializer: templates, fonts and buffers are loaded once per worker"""
+    global _worker_registry, _worker_base_url
+    _worker_registry = TemplateRegistry(manifest_path, default_path=template_path)
+    _worker_renderers.clear()
+    _worker_base_url = base_url
+
+def _renderer_for(domain):
+    template = _worker_registry.for_domain(domain)
+    renderer = _worker_renderers.get(template.key)
+    if renderer is None or renderer.template is not template:
+        renderer = CertificateRenderer(template, _worker_base_url)
+        _worker_renderers[template.key] = renderer
+    return renderer
+
+def _render_task(task):
+    """Render one (student, fingerprint, output_path) task in a worker"""
+    student, fingerprint, output_path = task
+    start_str, end_str = calculate_end_date(student['start_date'])
     try:
-        template = Image.open(template_path)
-        print(f"\n✅ Template loaded successfully!")
-        print(f"   Size: {template.size[0]}x{template.size[1]} pixels")
-        print(f"   Format: {template.format}")
-        print(f"📂 Output folder: {OUTPUT_FOLDER}/")
-        print(f"📊 Students to process: {len(STUDENTS)}")
-        print("\n" + "="*70)
+        renderer = _renderer_for(student['domain'])
+        renderer.render(student['name'], student['domain'],
+                        start_str, end_str, student['id'], output_path)
+        return student['id'], fingerprint, None, renderer.region_hashes
     except Exception as e:
-        print(f"\n❌ ERROR loading template: {e}")
-        print("The image file might be corrupted or invalid.")
-        input("Press ENTER to exit...")
-        return
-    
-    # Generate certificates
+        return student['id'], fingerprint, str(e), None
+
+def iter_tasks(students, checkpoint, args, registry):
+    """
+    Yield render tasks, skipping resumed and unchanged certificates;
+    registry is the TemplateRegistry the workers render from.
+    """
+    queued = 0
+    for student in students:
+        if args.limit is not None and queued >= args.limit:
+            return
+
+        cert_id = student['id']
+        start_str, end_str = calculate_end_date(student['start_date'])
+        fingerprint = certificate_fingerprint(cert_id, student['name'],
+                                              student['domain'], start_str,
+                                              end_str, args.base_url,
+                                              registry.for_domain(student['domain']).version)
+        output_path = os.path.join(args.output, f'{cert_id}.jpg')
+
+        if cert_id in checkpoint.interrupted:
+            continue
+        if (args.only_changed and checkpoint.is_current(cert_id, fingerprint)
+                and os.path.exists(output_path)):
+            continue
+
+        queued += 1
+        yield student, fingerprint, output_path
+
+    checkpoint.source_exhausted = True
+
+def run(tasks, checkpoint, args, hashes_conn=None):
+    """
+    Render tasks with args.workers processes; returns (success, failed).
+    Region hashes are saved through hashes_conn when it is given.
+    """
     success_count = 0
     fail_count = 0
-    
-    for student in STUDENTS:
-        if generate_certificate(student, template_path, OUTPUT_FOLDER):
+
+    def handle(result):
+        nonlocal success_count, fail_count
+        cert_id, fingerprint, error, hashes = result
+        if error:
+            fail_count += 1
+            print(f"❌ {cert_id}: {error}")
+        else:
             success_count += 1
+            checkpoint.record(cert_id, fingerprint)
+            if hashes_conn is not None:
+                perceptual.save_hashes(hashes_conn, cert_id, fingerprint, hashes)
+                if success_count % HASHES_COMMIT_EVERY == 0:
+                    hashes_conn.commit()
+            print(f"✅ {cert_id}")
+
+    if args.workers <= 1:
+        _init_worker(args.template, args.manifest, args.base_url)
+        for task in tasks:
+            handle(_render_task(task))
+        return success_count, fail_count
+
+    from multiprocessing import Pool
+
+    with Pool(args.workers, initializer=_init_worker,
+              initargs=(args.template, args.manifest, args.base_url)) as pool:
+        # Pool.imap drains its whole input up front, so feed it in slices
+        while True:
+            batch = list(islice(tasks, FEED_BATCH))
+            if not batch:
+                break
+            for result in pool.imap_unordered(_render_task, batch):
+                handle(result)
+
+    return success_count, fail_count
+
+# ========== URL EXPORT ==========
+
+def export_urls(students, args):
+    """Write id,verification_url for every student without rendering anything"""
+    signer = get_signer()
+    if signer is None:
+        print("⚠️  CERT_SIGNING_KEY not set - exporting unsigned /verify/<id> URLs")
+
+    count = 0
+    with open(args.export_urls, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'verification_url'])
+        if signer is None:
+            for student in students:
+                writer.writerow([student['id'], f"{args.base_url}/verify/{student['id']}"])
+                count += 1
         else:
-            fail_count += 1
-    
+            rows = ((student['id'], student['name'], student['domain'],
+                     *calculate_end_date(student['start_date'])) for student in students)
+            # One keyed HMAC for the whole batch; each token copies its state
+            for cert_id, token in signer.sign_batch(rows):
+                writer.writerow([cert_id, f"{args.base_url}/v/{token}"])
+                count += 1
+
+    print(f"🔏 Exported {count} verification URL(s) to {args.export_urls}\n")
+    return 0
+
+# ========== CLI ==========
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Generate NxtSync certificates in batch.')
+    parser.add_argument('--source', default=DEFAULT_SOURCE,
+                        help='certificates.db, a .csv or a .jsonl file (default: %(default)s)')
+    parser.add_argument('--template', default=None,
+                        help='default template image (default: auto-detect)')
+    parser.add_argument('--manifest', default=MANIFEST_PATH,
+                        help='named templates per domain (default: %(default)s)')
+    parser.add_argument('--output', default=OUTPUT_FOLDER,
+                        help='output folder (default: %(default)s)')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL,
+                        help='base URL encoded in the QR codes (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='render processes (default: %(default)s)')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT,
+                        help='checkpoint file (default: %(default)s)')
+    parser.add_argument('--restart', action='store_true',
+                        help='ignore an unfinished run instead of resuming it')
+    parser.add_argument('--only-changed', action='store_true',
+                        help='skip certificates whose rendered content has not changed')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='render at most this many certificates')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='list what would be rendered without writing anything')
+    parser.add_argument('--export-urls', metavar='CSV', default=None,
+                        help='write id,verification_url for every certificate and exit')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Main function; returns the process exit code"""
+    args = parse_args(argv)
+
+    print("\n" + "="*70)
+    print("🎓 NXTSYNC CERTIFICATE GENERATOR")
+    print("="*70 + "\n")
+
+    if not os.path.exists(args.source):
+        print(f"❌ ERROR: Source not found: {args.source}")
+        return 1
+
+    if args.export_urls:
+        return export_urls(iter_students(args.source, read_only=True), args)
+
+    print("🔍 Looking for template file...")
+    args.template = args.template or find_template()
+    if not args.template or not os.path.exists(args.template):
+        print("\n❌ ERROR: No template file found!")
+        print("   Put it in static/templates/blank_certificate_template.jpg")
+        print("   or pass --template PATH")
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+
+    checkpoint = Checkpoint(args.checkpoint)
+    if checkpoint.interrupted:
+        if args.restart:
+            print(f"🔁 Ignoring unfinished run ({len(checkpoint.interrupted)} done)")
+            checkpoint.interrupted.clear()
+        else:
+            print(f"⏯️  Resuming: {len(checkpoint.interrupted)} already rendered")
+
+    print(f"📄 Source: {args.source}")
+    print(f"🖼️  Template: {args.template}")
+    print(f"📂 Output folder: {args.output}/")
+    print(f"⚙️  Workers: {args.workers}")
+    print("="*70)
+
+    # Same templates as the workers, for the fingerprints
+    registry = TemplateRegistry(args.manifest, default_path=args.template)
+    tasks = iter_tasks(iter_students(args.source, read_only=args.dry_run),
+                       checkpoint, args, registry)
+
+    if args.dry_run:
+        count = 0
+        for student, fingerprint, output_path in tasks:
+            count += 1
+            print(f"📝 {student['id']} → {output_path}")
+        print(f"\n🧪 Dry run: {count} certificate(s) would be rendered\n")
+        return 0
+
+    hashes_conn = None
+    if is_database(args.source):
+        hashes_conn = db.connect(args.source)
+        db.migrate(hashes_conn)
+
+    checkpoint.open()
+    finished = False
+    try:
+        success_count, fail_count = run(tasks, checkpoint, args, hashes_conn)
+        finished = checkpoint.source_exhausted
+    finally:
+        checkpoint.close(finished)
+        if hashes_conn is not None:
+            hashes_conn.commit()
+            hashes_conn.close()
+
     # Summary
     print("\n" + "="*70)
     print("📊 GENERATION COMPLETE!")
     print(f"   ✅ Success: {success_count}")
     print(f"   ❌ Failed: {fail_count}")
-    print(f"   📂 Certificates saved in: {OUTPUT_FOLDER}/")
+    print(f"   📂 Certificates saved in: {args.output}/")
+    if not finished:
+        print("   ⏸️  Stopped at --limit - run again to continue")
     print("="*70 + "\n")
-    
-    # Show generated files
-    if success_count > 0:
-        print("🎉 Generated certificates:")
-        cert_files = sorted(os.listdir(OUTPUT_FOLDER))
-        for i, file in enumerate(cert_files, 1):
-            print(f"   {i}. {file}")
-        print()
-    
-    print("\n🚀 NOW YOU CAN RUN: python app.py")
-    print("   The certificates are in the correct location!\n")
-    
-    input("Press ENTER to exit...")
+
+    return 1 if fail_count else 0
 
 if __name__ == '__main__':
     try:
-        main()
-    except Exception as e:
-        print(f"\n❌ UNEXPECTED ERROR: {e}")
-        import traceback
-        traceback.print_exc()
-        input("\nPress ENTER to exit...")
\ No newline at end of file
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrupted - run again to resume")
+        sys.exit(130)
@@ -0,0 +1,115 @@
+"""
+Response compression (brotli when installed, else gzip).
+
+Responses that carry an ETag are compressed once and the bytes kept in a
+small cache keyed by ETag and encoding; precompress() fills that cache
+for the HTML pages at start-up so they are never compressed on a request.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_SIZE = 512
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+CACHE_ENTRIES = 512
+
+COMPRESSIBLE_TYPES = {
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'image/svg+xml',
+}
+
+# ETag suffix per encoding so compressed variants validate separately
+ETAG_SUFFIXES = ('-br', '-gzip')
+
+_cache = OrderedDict()
+_cache_lock = Lock()
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def choose_encoding():
+    """Best encoding the client accepts ('br', 'gzip' or None)"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compressed_body(data, encoding, etag):
+    if not etag:
+        return compress(data, encoding)
+
+    key = (etag, encoding)
+    with _cache_lock:
+        body = _cache.get(key)
+        if body is not None:
+            _cache.move_to_end(key)
+            return body
+
+    body = compress(data, encoding)
+    with _cache_lock:
+        _cache[key] = body
+        if len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return body
+
+
+def compress_response(response):
+    """after_request hook: compress eligible responses in place"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or 'Content-Encoding' in response.headers
+            or response.content_length is None
+            or response.content_length < MIN_SIZE):
+        return response
+
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    etag, weak = response.get_etag()
+    response.set_data(_compressed_body(response.get_data(), encoding, etag))
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak=weak)
+    return response
+
+
+def precompress(app, paths):
+    """Render paths once and cache their compressed bodies for every encoding"""
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+    client = app.test_client()
+    for path in paths:
+        response = client.get(path)
+        etag, _ = response.get_etag()
+        if response.status_code != 200 or not etag:
+            continue
+        for encoding in encodings:
+            _compressed_body(response.get_data(), encoding, etag)
+
+
+def init_app(app):
+    app.after_request(compress_response)
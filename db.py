@@ -0,0 +1,375 @@
+"""
+NXTSYNC DATABASE
+================
+Connection helper and versioned schema migrations for certificates.db.
+
+The schema version lives in PRAGMA user_version; migrate() applies every
+step above it in order, each in its own transaction.
+
+Schema (version 6):
+
+    domains       id INTEGER PK, name UNIQUE
+    cohorts       id INTEGER PK, domain_id -> domains, start_date, end_date
+    certificates  pk INTEGER PK (surrogate), id TEXT UNIQUE (public ID),
+                  name, name_key (normalized for lookups), domain_id,
+                  cohort_id, issue_date (as entered), start_date/end_date
+                  (validated ISO dates or NULL), certificate_url,
+                  row_version (bumped on every update), updated_at
+
+    data_version  single row; version is bumped by triggers on every write
+                  to certificates or domains
+
+    region_hashes cert_id PK, fingerprint of the render they were taken
+                  from, perceptual hashes of the name/domain/dates/QR
+                  regions and indexed 16-bit bands of the name hash (see
+                  perceptual.py)
+
+certificate_details is a view that joins the domain name back in, with
+the columns the app reads.
+"""
+
+from datetime import datetime
+from pathlib import Path
+import os
+import sqlite3
+
+DB_PATH = os.environ.get('CERT_DB_PATH', 'certificates.db')
+
+DETAIL_COLUMNS = 'id, name, domain, issue_date'
+
+# Rows pulled from a cursor per round trip when streaming
+DEFAULT_CHUNK_SIZE = 200
+
+
+def connect(path=None, read_only=False):
+    """Open the certificates database (read_only: never created, written or migrated)"""
+    if read_only:
+        uri = Path(path or DB_PATH).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, timeout=30)
+    else:
+        conn = sqlite3.connect(path or DB_PATH, timeout=30)
+    conn.execute('PRAGMA foreign_keys = ON')
+    return conn
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def name_key(name):
+    """Normalized name used for exact and prefix lookups"""
+    return ' '.join(name.split()).upper()
+
+
+def parse_date(value):
+    """ISO date string, or None when value isn't a valid YYYY-MM-DD date"""
+    try:
+        return datetime.strptime((value or '').strip(), '%Y-%m-%d').date().isoformat()
+    except ValueError:
+        return None
+
+
+# ========== MIGRATIONS ==========
+
+def _execute_script(conn, script):
+    """Run script statement by statement (executescript() would commit the migration)"""
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ''
+
+
+def _migration_1(conn):
+    """Original single-table schema"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS certificates
+                    (id TEXT PRIMARY KEY,
+                     name TEXT,
+                     domain TEXT,
+                     issue_date TEXT,
+                     certificate_url TEXT)''')
+
+
+def _migration_2(conn):
+    """Surrogate keys, normalized domains/cohorts, dates, indexes, row versions"""
+    _execute_script(conn, '''
+        CREATE TABLE domains (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+
+        CREATE TABLE cohorts (
+            id INTEGER PRIMARY KEY,
+            domain_id INTEGER NOT NULL REFERENCES domains(id),
+            start_date TEXT NOT NULL,
+            end_date TEXT,
+            UNIQUE (domain_id, start_date)
+        );
+
+        CREATE TABLE certificates_v2 (
+            pk INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            name_key TEXT NOT NULL,
+            domain_id INTEGER NOT NULL REFERENCES domains(id),
+            cohort_id INTEGER REFERENCES cohorts(id),
+            issue_date TEXT,
+            start_date TEXT CHECK (start_date IS NULL OR date(start_date) = start_date),
+            end_date TEXT CHECK (end_date IS NULL OR date(end_date) = end_date),
+            certificate_url TEXT,
+            row_version INTEGER NOT NULL DEFAULT 1,
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+
+    old = conn.execute('SELECT id, name, domain, issue_date, certificate_url FROM certificates')
+    for cert_id, name, domain, issue_date, certificate_url in old:
+        _insert(conn, cert_id, name or '', domain or '', issue_date,
+                certificate_url=certificate_url, table='certificates_v2')
+
+    _execute_script(conn, '''
+        DROP TABLE certificates;
+        ALTER TABLE certificates_v2 RENAME TO certificates;
+
+        CREATE INDEX idx_certificates_name_key ON certificates (name_key);
+        CREATE INDEX idx_certificates_domain_start ON certificates (domain_id, start_date);
+        CREATE INDEX idx_certificates_start_date ON certificates (start_date);
+        CREATE INDEX idx_certificates_cohort ON certificates (cohort_id);
+
+        CREATE TRIGGER certificates_row_version
+        AFTER UPDATE OF name, domain_id, cohort_id, issue_date, start_date, end_date
+        ON certificates
+        BEGIN
+            UPDATE certificates
+            SET row_version = OLD.row_version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE pk = NEW.pk;
+        END;
+
+        CREATE VIEW certificate_details AS
+        SELECT c.pk, c.id, c.name, c.name_key, d.name AS domain, c.issue_date,
+               c.start_date, c.end_date, c.certificate_url, c.row_version,
+               c.domain_id, c.cohort_id
+        FROM certificates c
+        JOIN domains d ON d.id = c.domain_id;
+    ''')
+
+
+def _migration_3(conn):
+    """Change counter for in-memory snapshots (see snapshot.py)"""
+    _execute_script(conn, '''
+        CREATE TABLE data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        );
+        INSERT INTO data_version (id, version) VALUES (1, 0);
+
+        CREATE TRIGGER certificates_insert_version AFTER INSERT ON certificates
+        BEGIN
+            UPDATE data_version SET version = version + 1;
+        END;
+
+        CREATE TRIGGER certificates_update_version AFTER UPDATE ON certificates
+        BEGIN
+            UPDATE data_version SET version = version + 1;
+        END;
+
+        CREATE TRIGGER certificates_delete_version AFTER DELETE ON certificates
+        BEGIN
+            UPDATE data_version SET version = version + 1;
+        END;
+
+        CREATE TRIGGER domains_update_version AFTER UPDATE ON domains
+        BEGIN
+            UPDATE data_version SET version = version + 1;
+        END;
+    ''')
+
+
+def _migration_4(conn):
+    """Perceptual hashes of rendered certificates, for tamper checks"""
+    _execute_script(conn, '''
+        CREATE TABLE region_hashes (
+            cert_id TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            name_hash INTEGER NOT NULL,
+            domain_hash INTEGER NOT NULL,
+            dates_hash INTEGER NOT NULL,
+            name_band0 INTEGER NOT NULL,
+            name_band1 INTEGER NOT NULL,
+            name_band2 INTEGER NOT NULL,
+            name_band3 INTEGER NOT NULL,
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE INDEX idx_region_hashes_band0 ON region_hashes (name_band0);
+        CREATE INDEX idx_region_hashes_band1 ON region_hashes (name_band1);
+        CREATE INDEX idx_region_hashes_band2 ON region_hashes (name_band2);
+        CREATE INDEX idx_region_hashes_band3 ON region_hashes (name_band3);
+    ''')
+
+
+def _migration_5(conn):
+    """Perceptual hash of the QR code region (NULL until the certificate is re-rendered)"""
+    _execute_script(conn, '''
+        ALTER TABLE region_hashes ADD COLUMN qr_hash INTEGER;
+    ''')
+
+
+def _migration_6(conn):
+    """Domain index in pk order, so a domain's listing pages need no sort"""
+    _execute_script(conn, '''
+        CREATE INDEX idx_certificates_domain ON certificates (domain_id);
+    ''')
+
+
+MIGRATIONS = [_migration_1, _migration_2, _migration_3, _migration_4, _migration_5,
+              _migration_6]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    """Bring the schema up to SCHEMA_VERSION; returns the version applied"""
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # explicit transactions so DDL rolls back too
+    try:
+        while True:
+            # IMMEDIATE so concurrent workers migrate one at a time
+            conn.execute('BEGIN IMMEDIATE')
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                conn.execute('COMMIT')
+                return version
+            try:
+                MIGRATIONS[version](conn)
+                conn.execute(f'PRAGMA user_version = {version + 1}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            print(f"🗄️  Migrated database to schema v{version + 1}")
+    finally:
+        conn.isolation_level = isolation_level
+
+
+# ========== READS ==========
+
+def data_version(conn):
+    """Counter that changes whenever certificates (or domain names) change"""
+    return conn.execute('SELECT version FROM data_version').fetchone()[0]
+
+
+def iter_rows(cursor, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield rows from an executed cursor without materializing them all"""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        for row in rows:
+            yield row
+
+
+LIST_COLUMNS = ('pk', 'id', 'name', 'domain', 'issue_date', 'start_date', 'end_date')
+
+
+def list_certificates(conn, domain=None, date_from=None, date_to=None,
+                      name_prefix=None, after_pk=None, limit=None):
+    """
+    Cursor over certificate_details rows (LIST_COLUMNS) in pk order.
+
+    Keyset pagination: pass the last pk seen as after_pk instead of an
+    OFFSET. Unfiltered and domain-only pages are index seeks in pk order
+    however deep they are; with a date range or name prefix SQLite seeks
+    that index and sorts the rows matching it by pk.
+    """
+    where = []
+    params = []
+    if domain:
+        where.append('domain_id = (SELECT id FROM domains WHERE name = ?)')
+        params.append(domain)
+    if date_from:
+        where.append('start_date >= ?')
+        params.append(date_from)
+    if date_to:
+        where.append('start_date <= ?')
+        params.append(date_to)
+    if name_prefix:
+        key = name_key(name_prefix)
+        where.append('name_key >= ? AND name_key < ? || char(1114111)')
+        params.extend([key, key])
+    if after_pk is not None:
+        where.append('pk > ?')
+        params.append(after_pk)
+
+    sql = f'SELECT {", ".join(LIST_COLUMNS)} FROM certificate_details'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY pk'
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    return conn.execute(sql, params)
+
+
+def iter_list_paged(conn, page_size=DEFAULT_CHUNK_SIZE, after_pk=None, **filters):
+    """
+    Yield list_certificates() rows one keyset page at a time. Each page is
+    read to the end, so unlike iter_rows() no read lock is held between
+    pages and other connections can commit meanwhile.
+    """
+    while True:
+        rows = list_certificates(conn, after_pk=after_pk, limit=page_size, **filters).fetchall()
+        if not rows:
+            return
+        yield from rows
+        after_pk = rows[-1][0]
+
+
+def iter_details_paged(conn, page_size=DEFAULT_CHUNK_SIZE):
+    """Yield every (id, name, domain, issue_date) in pk order (see iter_list_paged)"""
+    for pk, cert_id, name, domain, issue_date, _, _ in iter_list_paged(conn, page_size):
+        yield cert_id, name, domain, issue_date
+
+
+# ========== WRITES ==========
+
+def _domain_id(conn, domain):
+    conn.execute('INSERT OR IGNORE INTO domains (name) VALUES (?)', (domain,))
+    return conn.execute('SELECT id FROM domains WHERE name = ?', (domain,)).fetchone()[0]
+
+
+def _cohort_id(conn, domain_id, start_date, end_date):
+    if start_date is None:
+        return None
+    conn.execute('INSERT OR IGNORE INTO cohorts (domain_id, start_date, end_date) VALUES (?, ?, ?)',
+                 (domain_id, start_date, end_date))
+    return conn.execute('SELECT id FROM cohorts WHERE domain_id = ? AND start_date = ?',
+                        (domain_id, start_date)).fetchone()[0]
+
+
+def _insert(conn, cert_id, name, domain, issue_date, end_date=None,
+            certificate_url=None, table='certificates', or_ignore=False):
+    domain_id = _domain_id(conn, domain)
+    start_date = parse_date(issue_date)
+    end_date = parse_date(end_date)
+    cohort_id = _cohort_id(conn, domain_id, start_date, end_date)
+    conn.execute(
+        f'''INSERT {'OR IGNORE ' if or_ignore else ''}INTO {table}
+            (id, name, name_key, domain_id, cohort_id, issue_date,
+             start_date, end_date, certificate_url)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        (cert_id, name, name_key(name), domain_id, cohort_id, issue_date,
+         start_date, end_date, certificate_url or None))
+
+
+def insert_certificates(conn, certificates, end_date_for=None, or_ignore=True):
+    """
+    Insert (id, name, domain, issue_date) tuples, creating domains and
+    cohorts as needed. end_date_for(issue_date) fills the end date.
+    """
+    with conn:
+        for cert_id, name, domain, issue_date in certificates:
+            end_date = end_date_for(issue_date) if end_date_for else None
+            _insert(conn, cert_id, name, domain, issue_date, end_date,
+                    or_ignore=or_ignore)
@@ -0,0 +1,25 @@
+"""
+Fast JSON responses for the API routes (orjson when installed).
+"""
+
+import json
+
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(payload):
+    """Compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    """Drop-in for jsonify() that skips key sorting and pretty-printing"""
+    return current_app.response_class(dumps(payload), status=status,
+                                      mimetype='application/json')
@@ -0,0 +1,51 @@
+"""
+Render fingerprints, kept free of PIL/qrcode so metadata-only code paths
+(ETags, image URLs, checkpoints) don't pull in the rendering stack.
+"""
+
+import hashlib
+import os
+
+from signing import get_signer
+
+# Bump when the layout changes so fingerprints (and cached renders) expire
+RENDER_VERSION = 1
+
+
+def certificate_fingerprint(cert_id, name, domain, start_date, end_date, base_url,
+                            template_version):
+    """
+    Short hash of everything that ends up on the rendered image;
+    template_version is the CertificateTemplate.version it is drawn on.
+    """
+    parts = [RENDER_VERSION, cert_id, name, domain, start_date, end_date, base_url,
+             template_version]
+    signer = get_signer()
+    if signer is not None:
+        # The QR code carries a signed token, so a new key means a new image
+        parts.append(signer.key_id)
+    payload = '\x1f'.join(str(part) for part in parts)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def fingerprint_path(image_path):
+    """Sidecar recording which fingerprint an image was rendered from"""
+    return os.path.splitext(image_path)[0] + '.fp'
+
+
+def record_fingerprint(image_path, fingerprint):
+    tmp_path = f'{fingerprint_path(image_path)}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='ascii') as f:
+        f.write(fingerprint)
+    os.replace(tmp_path, fingerprint_path(image_path))
+
+
+def rendered_fingerprint(image_path):
+    """Fingerprint image_path was rendered from (None if missing or unrecorded)"""
+    if not os.path.exists(image_path):
+        return None
+    try:
+        with open(fingerprint_path(image_path), encoding='ascii') as f:
+            return f.read().strip()
+    except OSError:
+        return None
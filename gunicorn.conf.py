@@ -0,0 +1,32 @@
+"""
+Gunicorn settings, picked up automatically from the working directory.
+
+The app is imported (and warmed up: DB migration, templates, fonts,
+precompressed pages) once in the master, so every worker forks ready to
+serve instead of paying the cold start on its first request.
+
+Each worker runs a few threads; rate_limit.py caps how many of them
+expensive routes may hold, so verifications always find a free one.
+
+The master also forks the render queue consumers (render_queue.py), so
+all workers share one bounded pool of render processes.
+"""
+
+import os
+
+preload_app = True
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+
+def when_ready(server):
+    import render_queue
+    from app import render_job
+    render_queue.start_consumers(render_job)
+
+
+def on_exit(server):
+    import render_queue
+    render_queue.stop_consumers()
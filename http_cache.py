@@ -0,0 +1,69 @@
+"""
+HTTP caching helpers: Cache-Control policies, ETags and 304 responses.
+"""
+
+from flask import request, make_response
+from werkzeug.datastructures import ResponseCacheControl
+
+from compression import ETAG_SUFFIXES
+
+# Cache-Control policies per kind of response (seconds)
+POLICIES = {
+    # Pages are the same HTML for every certificate; revalidated by ETag
+    'page': {'public': True, 'max_age': 3600},
+    # Verification data; short so corrections/revocations show up quickly
+    'api': {'public': True, 'max_age': 300},
+    # Fingerprinted image URLs never change content
+    'immutable': {'public': True, 'max_age': 31536000, 'immutable': True},
+    # Misses and errors may start succeeding after an import
+    'no-cache': {'no_cache': True},
+}
+
+
+def apply_policy(response, policy):
+    """Set the Cache-Control header of response from a named policy"""
+    for attr, value in POLICIES[policy].items():
+        setattr(response.cache_control, attr, value)
+    return response
+
+
+def cache_control_value(policy):
+    """Cache-Control header value for a named policy (for non-Flask responses)"""
+    cache_control = ResponseCacheControl()
+    for attr, value in POLICIES[policy].items():
+        setattr(cache_control, attr, value)
+    return cache_control.to_header()
+
+
+def client_has(etag):
+    """Whether If-None-Match lists etag or one of its compressed variants"""
+    if_none_match = request.if_none_match
+    return any(f'{etag}{suffix}' in if_none_match
+               for suffix in ('',) + ETAG_SUFFIXES)
+
+
+def not_modified(etag, policy):
+    """A 304 response if the client already has etag, else None"""
+    if client_has(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return apply_policy(response, policy)
+    return None
+
+
+def cached(response, policy, etag=None):
+    """
+    Finish a response with a cache policy and ETag and turn it into a 304
+    when the client's copy is current. Without etag one is hashed from
+    the body.
+    """
+    response = make_response(response)
+    if etag:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+        etag, _ = response.get_etag()
+    apply_policy(response, policy)
+    if response.status_code == 200:
+        return not_modified(etag, policy) or response
+    return response
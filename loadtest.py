@@ -0,0 +1,501 @@
+"""
+NXTSYNC LOAD TEST
+=================
+Seeds a synthetic certificates database, starts gunicorn on it from a
+scratch copy of the app, and replays a realistic traffic mix:
+
+- scan     burst QR scans of a few hot IDs (page, JSON, image; repeat
+           visitors revalidate with If-None-Match)
+- search   name searches, half of them with a typo
+- cold     first scans of IDs that have no image yet (lazy render)
+- listing  /api/certificates pages
+- plus one concurrent POST /api/regenerate-all part-way through
+
+and reports throughput and p50/p95/p99 latency per route.
+
+    python loadtest.py                                   # 2000 rows, 30 s, 16 clients
+    python loadtest.py --rows 100000 --duration 60 --concurrency 32
+    python loadtest.py --asgi --mix scan=80,search=20 --no-regenerate
+    python loadtest.py --report before.json              # save results to compare
+
+Rate limits are switched off unless --rate-limits is given, since every
+simulated client shares one IP.
+"""
+
+from http.client import HTTPConnection, HTTPException
+from threading import Lock, Thread
+from urllib.parse import quote, urlsplit
+import argparse
+import glob
+import gzip
+import json
+import math
+import os
+import random
+import secrets
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import db
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Same fixed end date as app.INTERNSHIP_END_DATE (importing app would start it)
+END_DATE = "2025-08-19"
+
+DEFAULT_MIX = 'scan=70,search=15,cold=10,listing=5'
+
+DOMAINS = [
+    'Full Stack Web Development',
+    'Data Science',
+    'Machine Learning',
+    'Cloud Computing',
+    'Cyber Security',
+    'Android Development',
+]
+
+START_DATES = ['2025-01-06', '2025-03-03', '2025-05-19', '2025-07-07', '2025-09-01']
+
+SURNAMES = [
+    'PULLABHOTLA', 'KOVURU', 'DODDA', 'GOTTEMUKKALA', 'TATIPAKALA', 'CHEGIREDDY',
+    'SINGAMPALLI', 'MANDALAPU', 'REDDY', 'VARMA', 'NAIDU', 'RAO', 'SHARMA',
+    'KUMAR', 'PATEL', 'IYER', 'MENON', 'GUPTA', 'CHOWDARY', 'BOLLA',
+]
+
+GIVEN_NAMES = [
+    'VENKATARAMA', 'PRANEETH', 'YUVARATNA', 'KEERTHI', 'VINEELA', 'KARTHEEK',
+    'UMA', 'JAYA', 'SREE', 'MARUTHI', 'SAI', 'KRISHNA', 'LAKSHMI', 'RAHUL',
+    'DIVYA', 'ANIL', 'SWATHI', 'HARSHA', 'PRIYA', 'TEJA', 'MANOJ', 'SANDEEP',
+]
+
+REQUEST_TIMEOUT = 60
+
+ACCEPT_ENCODING = 'br, gzip' if brotli is not None else 'gzip'
+
+# ========== SYNTHETIC DATA ==========
+
+def synthetic_name(rng):
+    given = rng.sample(GIVEN_NAMES, rng.choice((1, 1, 2, 3)))
+    return ' '.join([rng.choice(SURNAMES)] + given)
+
+def seed_database(path, rows, seed):
+    """Create a database with rows synthetic certificates; returns [(id, name)]"""
+    rng = random.Random(seed)
+    students = []
+    for n in range(1, rows + 1):
+        students.append((f'LT{n:06d}', synthetic_name(rng), rng.choice(DOMAINS),
+                         rng.choice(START_DATES)))
+
+    conn = db.connect(path)
+    db.migrate(conn)
+    db.insert_certificates(conn, students, end_date_for=lambda start: END_DATE)
+    conn.close()
+    return [(cert_id, name) for cert_id, name, _, _ in students]
+
+def misspell(name, rng):
+    """name with one character dropped, doubled or swapped"""
+    i = rng.randrange(1, len(name) - 1)
+    edit = rng.choice(('drop', 'double', 'swap'))
+    if edit == 'drop':
+        return name[:i] + name[i + 1:]
+    if edit == 'double':
+        return name[:i] + name[i] + name[i:]
+    return name[:i - 1] + name[i] + name[i - 1] + name[i + 1:]
+
+# ========== SERVER ==========
+
+def prepare_workdir(workdir):
+    """Copy the app into workdir so renders and regeneration stay out of the repo"""
+    for path in glob.glob(os.path.join(ROOT, '*.py')):
+        shutil.copy(path, workdir)
+    shutil.copytree(os.path.join(ROOT, 'templates'), os.path.join(workdir, 'templates'),
+                    ignore=shutil.ignore_patterns('*.jpg'))
+    if os.path.isdir(os.path.join(ROOT, 'static', 'templates')):
+        shutil.copytree(os.path.join(ROOT, 'static', 'templates'),
+                        os.path.join(workdir, 'static', 'templates'))
+    for path in glob.glob(os.path.join(ROOT, '*.jpg')) + glob.glob(os.path.join(ROOT, '*.png')):
+        shutil.copy(path, workdir)
+    os.makedirs(os.path.join(workdir, 'static', 'certificates'), exist_ok=True)
+
+def start_server(workdir, args, admin_token):
+    """Start gunicorn in workdir; returns (process, log path)"""
+    env = dict(os.environ,
+               CERT_DB_PATH=os.path.join(workdir, 'loadtest.db'),
+               RATE_LIMIT_DB=os.path.join(workdir, 'rate_limits.db'),
+               RATE_LIMITS='1' if args.rate_limits else '0',
+               ADMIN_TOKEN=admin_token,
+               PORT=str(args.port),
+               WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_THREADS=str(args.threads))
+    env.pop('RENDER', None)
+
+    command = [sys.executable, '-m', 'gunicorn']
+    if args.asgi:
+        command += ['asgi:application', '-k', 'uvicorn_worker.UvicornWorker']
+    else:
+        command += ['app:app']
+
+    log_path = os.path.join(workdir, 'gunicorn.log')
+    log = open(log_path, 'w')
+    # Own process group, so stopping it also stops workers and render pools
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log,
+                               stderr=subprocess.STDOUT, start_new_session=True)
+    log.close()
+    return process, log_path
+
+def stop_server(process):
+    """Stop gunicorn and everything it started"""
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        pass
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def port_in_use(port):
+    try:
+        HTTPConnection('127.0.0.1', port, timeout=1).connect()
+        return True
+    except OSError:
+        return False
+
+def wait_until_ready(port, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            conn = HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            conn.close()
+            return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+# ========== MEASUREMENT ==========
+
+class Stats:
+    """Latencies (ms) and status counts per route label"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self._lock = Lock()
+
+    def record(self, label, elapsed_ms, status):
+        with self._lock:
+            self.latencies.setdefault(label, []).append(elapsed_ms)
+            counts = self.statuses.setdefault(label, {})
+            counts[status] = counts.get(status, 0) + 1
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class Client:
+    """One keep-alive connection, like a single browser"""
+
+    def __init__(self, port, stats, timeout=REQUEST_TIMEOUT):
+        self.port = port
+        self.stats = stats
+        self.timeout = timeout
+        self.conn = None
+        self.etags = {}
+
+    def request(self, label, method, path, headers=None, revalidate=False):
+        """Send one request; returns (status, body) with status 'error' on failure"""
+        headers = {'Accept-Encoding': ACCEPT_ENCODING, **(headers or {})}
+        if revalidate and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+
+        start = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = HTTPConnection('127.0.0.1', self.port, timeout=self.timeout)
+            self.conn.request(method, path, headers=headers)
+            response = self.conn.getresponse()
+            body = response.read()
+            status = response.status
+            if response.getheader('ETag'):
+                self.etags[path] = response.getheader('ETag')
+            encoding = response.getheader('Content-Encoding')
+            if encoding == 'gzip':
+                body = gzip.decompress(body)
+            elif encoding == 'br':
+                body = brotli.decompress(body)
+        except (OSError, HTTPException, ValueError) as e:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            status, body = 'error', str(e)
+        self.stats.record(label, (time.perf_counter() - start) * 1000, status)
+        return status, body
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+# ========== SCENARIOS ==========
+
+class Traffic:
+    """Shared state the scenarios draw IDs and names from"""
+
+    def __init__(self, students, hot_count, rng):
+        shuffled = students[:]
+        rng.shuffle(shuffled)
+        self.hot = shuffled[:hot_count]
+        self.cold = shuffled[hot_count:]
+        self.names = [name for _, name in students]
+        self._lock = Lock()
+
+    def next_cold(self, rng):
+        with self._lock:
+            if self.cold:
+                return self.cold.pop()
+        return rng.choice(self.hot)
+
+def scan(client, traffic, rng):
+    """QR scan of a hot ID: verify page, certificate JSON, then the image"""
+    # Hot IDs are skewed too: a few certificates get most of the scans
+    cert_id, _ = traffic.hot[min(int(rng.expovariate(1 / 5)), len(traffic.hot) - 1)]
+    repeat = rng.random() < 0.5
+    client.request('GET /verify/<id>', 'GET', f'/verify/{cert_id}', revalidate=repeat)
+    status, body = client.request('GET /api/certificate/<id>', 'GET',
+                                  f'/api/certificate/{cert_id}', revalidate=repeat)
+    fetch_image(client, status, body, repeat)
+
+def cold(client, traffic, rng):
+    """First scan of a certificate that has not been rendered yet"""
+    cert_id, _ = traffic.next_cold(rng)
+    status, body = client.request('GET /api/certificate/<id> (cold)', 'GET',
+                                  f'/api/certificate/{cert_id}')
+    fetch_image(client, status, body, False)
+
+def fetch_image(client, status, body, repeat):
+    if status != 200 or not body:
+        return
+    url = json.loads(body).get('certificate_url')
+    if url:
+        client.request('GET /certificates/<id>.<v>.jpg', 'GET', urlsplit(url).path,
+                       revalidate=repeat)
+
+def search(client, traffic, rng):
+    """Name search, exact or with a typo"""
+    name = rng.choice(traffic.names)
+    if rng.random() < 0.5:
+        name = misspell(name, rng)
+    client.request('GET /api/search', 'GET', f'/api/search?name={quote(name)}')
+
+def listing(client, traffic, rng):
+    """A page of /api/certificates, filtered by domain half the time"""
+    path = '/api/certificates?limit=50'
+    if rng.random() < 0.5:
+        path += f'&domain={quote(rng.choice(DOMAINS))}'
+    client.request('GET /api/certificates', 'GET', path)
+
+SCENARIOS = {
+    'scan': scan,
+    'search': search,
+    'cold': cold,
+    'listing': listing,
+}
+
+def parse_mix(text):
+    """'scan=70,search=30' -> ([scenario functions], [weights])"""
+    functions, weights = [], []
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in SCENARIOS:
+            raise ValueError(f'Unknown scenario {name.strip()!r} (choose from {", ".join(SCENARIOS)})')
+        functions.append(SCENARIOS[name.strip()])
+        weights.append(float(weight or 1))
+    return functions, weights
+
+def client_loop(port, stats, traffic, mix, deadline, seed):
+    rng = random.Random(seed)
+    functions, weights = mix
+    client = Client(port, stats)
+    try:
+        while time.monotonic() < deadline:
+            rng.choices(functions, weights)[0](client, traffic, rng)
+    finally:
+        client.close()
+
+def regenerate(port, stats, admin_token, delay, done):
+    """POST /api/regenerate-all once, delay seconds into the run"""
+    time.sleep(delay)
+    client = Client(port, stats, timeout=None)
+    client.request('POST /api/regenerate-all', 'POST', '/api/regenerate-all',
+                   headers={'Authorization': f'Bearer {admin_token}'})
+    client.close()
+    done.append(True)
+
+# ========== REPORT ==========
+
+def summarize(stats, elapsed):
+    """Per-route results as a dict (also what --report writes)"""
+    routes = {}
+    for label, latencies in sorted(stats.latencies.items()):
+        latencies = sorted(latencies)
+        statuses = stats.statuses[label]
+        routes[label] = {
+            'requests': len(latencies),
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p95_ms': round(percentile(latencies, 95), 1),
+            'p99_ms': round(percentile(latencies, 99), 1),
+            'statuses': {str(status): count for status, count in statuses.items()},
+        }
+    total = sum(route['requests'] for route in routes.values())
+    return {'elapsed_s': round(elapsed, 1), 'requests': total,
+            'rps': round(total / elapsed, 1), 'routes': routes}
+
+def print_report(summary, args):
+    print("\n" + "="*96)
+    print(f"📊 RESULTS: {summary['requests']} requests in {summary['elapsed_s']}s "
+          f"({summary['rps']} req/s) with {args.concurrency} clients")
+    print("="*96)
+    print(f"{'route':<36}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}   statuses")
+    for label, route in summary['routes'].items():
+        statuses = ' '.join(f'{status}:{count}' for status, count in sorted(route['statuses'].items()))
+        print(f"{label:<36}{route['requests']:>9}{route['rps']:>9}{route['p50_ms']:>9}"
+              f"{route['p95_ms']:>9}{route['p99_ms']:>9}   {statuses}")
+    print("="*96 + "\n")
+
+# ========== CLI ==========
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Load test the certificate service with synthetic scan traffic.')
+    parser.add_argument('--rows', type=int, default=2000,
+                        help='synthetic certificates to seed (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='seconds of traffic (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='simulated clients (default: %(default)s)')
+    parser.add_argument('--hot', type=int, default=50,
+                        help='IDs that receive the scan bursts (default: %(default)s)')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help='scenario weights (default: %(default)s)')
+    parser.add_argument('--regenerate', action=argparse.BooleanOptionalAction, default=True,
+                        help='fire one POST /api/regenerate-all during the run (default: on)')
+    parser.add_argument('--regenerate-at', type=float, default=None,
+                        help='seconds into the run to regenerate (default: a third of --duration)')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='gunicorn workers (default: %(default)s)')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='threads per gunicorn worker (default: %(default)s)')
+    parser.add_argument('--asgi', action='store_true',
+                        help='serve asgi:application with uvicorn workers')
+    parser.add_argument('--rate-limits', action='store_true',
+                        help='keep rate limiting on (all clients share one IP)')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='port for the gunicorn under test (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='random seed for data and traffic (default: %(default)s)')
+    parser.add_argument('--report', default=None,
+                        help='also write the results as JSON to this file')
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the scratch directory (DB, renders, gunicorn log)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Main function; returns the process exit code"""
+    args = parse_args(argv)
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        print(f"❌ ERROR: {e}")
+        return 2
+
+    print("\n" + "="*70)
+    print("🏋️  NXTSYNC LOAD TEST")
+    print("="*70 + "\n")
+
+    workdir = tempfile.mkdtemp(prefix='nxtsync-loadtest-')
+    process = None
+    try:
+        prepare_workdir(workdir)
+
+        print(f"🌱 Seeding {args.rows} synthetic certificates...")
+        started = time.perf_counter()
+        students = seed_database(os.path.join(workdir, 'loadtest.db'), args.rows, args.seed)
+        print(f"   done in {time.perf_counter() - started:.1f}s")
+
+        if port_in_use(args.port):
+            print(f"❌ ERROR: Port {args.port} is already in use, pick another with --port")
+            return 1
+
+        admin_token = secrets.token_urlsafe(16)
+        process, log_path = start_server(workdir, args, admin_token)
+        print(f"🚀 Starting gunicorn ({'asgi' if args.asgi else 'wsgi'}, "
+              f"{args.workers} workers) on port {args.port}...")
+        if not wait_until_ready(args.port, process):
+            print(f"❌ ERROR: Server did not start, see {log_path}")
+            args.keep = True
+            return 1
+
+        stats = Stats()
+        rng = random.Random(args.seed)
+        traffic = Traffic(students, min(args.hot, len(students)), rng)
+
+        print(f"🔥 {args.concurrency} clients for {args.duration:.0f}s, mix {args.mix}")
+        started = time.monotonic()
+        deadline = started + args.duration
+        clients = [Thread(target=client_loop, daemon=True,
+                          args=(args.port, stats, traffic, mix, deadline, args.seed + i))
+                   for i in range(args.concurrency)]
+
+        regenerated = []
+        if args.regenerate:
+            delay = args.duration / 3 if args.regenerate_at is None else args.regenerate_at
+            Thread(target=regenerate, daemon=True,
+                   args=(args.port, stats, admin_token, delay, regenerated)).start()
+
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        summary = summarize(stats, elapsed)
+        print_report(summary, args)
+        if args.regenerate and not regenerated:
+            print("⏳ Regeneration was still running when traffic stopped")
+
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2)
+            print(f"📝 Report saved to {args.report}")
+        return 0
+    finally:
+        if process is not None:
+            stop_server(process)
+        if args.keep:
+            print(f"📂 Scratch directory kept: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrupted")
+        sys.exit(130)
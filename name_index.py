@@ -0,0 +1,144 @@
+"""
+NXTSYNC FUZZY NAME INDEX
+========================
+In-memory index for typo- and order-tolerant name search.
+
+Every name is split into tokens. The index keeps two inverted lists,
+both order-independent so transposed surnames still match:
+
+- character trigrams of each token (catches typos like PRANEET/PRANEETH)
+- a Soundex key per token (catches spellings that sound alike)
+
+Postings are compact array('I') lists of document numbers and only the
+certificate pk is stored per document (about 100 MB for a million
+names). Names for the winning pks are looked up afterwards.
+"""
+
+from array import array
+from threading import Lock
+import heapq
+import time
+
+SOUNDEX_CODES = {}
+for _letters, _code in (('BFPV', '1'), ('CGJKQSXZ', '2'), ('DT', '3'),
+                        ('L', '4'), ('MN', '5'), ('R', '6')):
+    for _letter in _letters:
+        SOUNDEX_CODES[_letter] = _code
+
+# Skip postings longer than this fraction of the index (they barely rank)
+MAX_POSTING_FRACTION = 0.05
+# Weight of the phonetic match next to the trigram (Dice) similarity
+PHONETIC_WEIGHT = 0.35
+
+
+def tokens(name):
+    """Upper-cased alphabetic tokens of a name"""
+    cleaned = ''.join(ch if ch.isalpha() else ' ' for ch in name.upper())
+    return cleaned.split()
+
+
+def soundex(token):
+    """Classic 4-character Soundex code of one token"""
+    first = token[0]
+    code = first
+    previous = SOUNDEX_CODES.get(first, '')
+    for ch in token[1:]:
+        digit = SOUNDEX_CODES.get(ch, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if ch not in 'HW':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def trigrams(name_tokens):
+    """Set of padded character trigrams over all tokens"""
+    grams = set()
+    for token in name_tokens:
+        padded = f'  {token} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class NameIndex:
+    """Trigram + Soundex index over certificate names, keyed by pk"""
+
+    def __init__(self):
+        self.pks = array('I')      # document number -> certificate pk
+        self.sizes = array('H')    # document number -> trigram count
+        self.trigram_postings = {}
+        self.phonetic_postings = {}
+        self.last_pk = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self.pks)
+
+    def add(self, pk, name):
+        """
+        Index one certificate name. Inserts only ever append larger pks, so
+        pks at or below last_pk are already indexed and ignored.
+        """
+        name_tokens = tokens(name)
+        grams = trigrams(name_tokens)
+        with self._lock:
+            if pk <= self.last_pk:
+                return
+            doc = len(self.pks)
+            self.pks.append(pk)
+            self.sizes.append(min(len(grams), 0xFFFF))
+            for gram in grams:
+                self.trigram_postings.setdefault(gram, array('I')).append(doc)
+            for code in {soundex(token) for token in name_tokens}:
+                self.phonetic_postings.setdefault(code, array('I')).append(doc)
+            self.last_pk = pk
+
+    def add_rows(self, rows):
+        """Index (pk, name) rows, e.g. streamed from the database"""
+        for pk, name in rows:
+            self.add(pk, name)
+
+    def search(self, query, limit=5, budget_ms=50.0, min_score=0.3):
+        """
+        Ranked [(pk, score)] for query, best first.
+
+        Rare postings are scanned first; once budget_ms is spent the
+        remaining (most common) ones are skipped, so latency stays bounded
+        on very large indexes at a small cost in recall.
+        """
+        deadline = time.perf_counter() + budget_ms / 1000.0
+        query_tokens = tokens(query)
+        if not query_tokens:
+            return []
+        query_grams = trigrams(query_tokens)
+        query_codes = {soundex(token) for token in query_tokens}
+
+        max_posting = max(1000, int(len(self.pks) * MAX_POSTING_FRACTION))
+        shared = {}
+        phonetic = {}
+
+        def scan(postings, keys, counts):
+            lists = [postings[key] for key in keys if key in postings]
+            for posting in sorted(lists, key=len):
+                if len(posting) > max_posting or time.perf_counter() > deadline:
+                    break
+                for doc in posting:
+                    counts[doc] = counts.get(doc, 0) + 1
+
+        scan(self.phonetic_postings, query_codes, phonetic)
+        scan(self.trigram_postings, query_grams, shared)
+
+        query_size = len(query_grams)
+        scored = []
+        for doc in shared.keys() | phonetic.keys():
+            dice = 2.0 * shared.get(doc, 0) / (query_size + self.sizes[doc])
+            sounds = phonetic.get(doc, 0) / len(query_codes)
+            score = (1 - PHONETIC_WEIGHT) * dice + PHONETIC_WEIGHT * sounds
+            if score >= min_score:
+                scored.append((score, doc))
+
+        best = heapq.nlargest(limit, scored)
+        return [(self.pks[doc], round(score, 3)) for score, doc in best]
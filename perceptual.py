@@ -0,0 +1,237 @@
+"""
+NXTSYNC REGION HASHES
+=====================
+Perceptual hashes of a certificate's name, domain and dates, used to tell
+whether an uploaded certificate image matches what we issued.
+
+Each text region is a horizontal band around a text position of the
+template layout; one more region covers the QR code. The blank template is
+subtracted so only the ink is left, the ink is cropped to its bounding box
+and reduced to a small grid (32x2 for text, 8x8 for the QR code), and
+neighbouring cells are compared (a difference hash): 64 bits per region. Hashes of the
+canonical render are stored when it is rendered (region_hashes table), so a
+check hashes the upload once and compares Hamming distances instead of
+re-rendering and diffing pixels. QR codes are read with OpenCV
+(opencv-python-headless).
+
+Hashes survive JPEG re-compression and rescaling and change when a word is
+replaced. Single-glyph edits (one digit of a date) are below what they can
+see; the signed QR code (signing.py) covers those.
+"""
+
+from PIL import Image, ImageChops
+
+# Text region -> (layout position it is centred on, band height as a fraction of the image)
+TEXT_REGIONS = {
+    'name': ('name_y', 0.08),
+    'domain': ('domain_y', 0.04),
+    'dates': ('text2_y', 0.035),
+}
+
+# Every hashed region: the text bands and the QR code (a pasted-over QR
+# pointing elsewhere is caught even when it can't be decoded)
+REGIONS = (*TEXT_REGIONS, 'qr')
+
+# Central fraction of the width the bands cover (text is centred)
+REGION_WIDTH = 0.8
+
+# Grid per region: columns x rows differences = 64-bit hash. Text is wide
+# and flat; a QR code is square and needs rows to tell two apart
+HASH_GRIDS = {'name': (32, 2), 'domain': (32, 2), 'dates': (32, 2), 'qr': (8, 8)}
+
+# Difference from the blank template that counts as ink
+INK_THRESHOLD = 48
+# Neighbouring cells must differ by more than this to set a bit (JPEG noise)
+TIE_MARGIN = 2
+
+# Hamming distance up to MATCH_DISTANCE: same text; from MISMATCH_DISTANCE: different
+MATCH_DISTANCE = 10
+MISMATCH_DISTANCE = 20
+
+# The name hash is also stored as 16-bit bands, each indexed: hashes within
+# 3 bits of each other always share a band, so lookups are index seeks
+BAND_BITS = 16
+BANDS = 4
+
+# Candidates read per band when looking up by hash
+BAND_LIMIT = 200
+
+# Scaled-down uploads: QR detection is retried on copies enlarged by these
+# factors, for images no wider than QR_UPSCALE_MAX_WIDTH
+QR_UPSCALES = (2, 3)
+QR_UPSCALE_MAX_WIDTH = 2400
+
+# cv2 once decode_qr() has imported it (False if OpenCV isn't installed);
+# imported on first use so rendering doesn't load it
+_cv2 = None
+
+
+# ========== HASHING ==========
+
+def region_box(size, positions, region):
+    """Pixel box (left, top, right, bottom) of a region for an image size"""
+    width, height = size
+    if region == 'qr':
+        from rendering import QR_SIZE, QR_MAX_SIZE
+        # Largest QR code the renderer draws, bottom-anchored like the render
+        bottom = int(height * positions['qr_y']) + QR_SIZE
+        left = width // 2 - QR_MAX_SIZE // 2
+        return (left, bottom - QR_MAX_SIZE, left + QR_MAX_SIZE, bottom)
+    position, band = TEXT_REGIONS[region]
+    center = positions[position] * height
+    margin = width * (1 - REGION_WIDTH) / 2
+    return (int(margin), int(center - band * height / 2),
+            int(width - margin), int(center + band * height / 2))
+
+
+def dhash(ink, columns=32, rows=2):
+    """columns x rows bit difference hash of a grayscale ink image (0 for no ink)"""
+    bbox = ink.point(lambda value: 255 if value > INK_THRESHOLD else 0).getbbox()
+    if bbox is None:
+        return 0
+    grid = ink.crop(bbox).resize((columns + 1, rows), Image.Resampling.BOX)
+    cells = grid.tobytes()
+    value = 0
+    for row in range(rows):
+        offset = row * (columns + 1)
+        for col in range(offset, offset + columns):
+            value = (value << 1) | (cells[col] > cells[col + 1] + TIE_MARGIN)
+    return value
+
+
+def region_hashes(image, template):
+    """{region: hash} of an RGB image the size of template (a CertificateTemplate)"""
+    hashes = {}
+    for region in REGIONS:
+        box = region_box(template.size, template.positions, region)
+        ink = ImageChops.difference(image.crop(box), template.image.crop(box)).convert('L')
+        hashes[region] = dhash(ink, *HASH_GRIDS[region])
+    return hashes
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def compare(hashes, reference):
+    """({region: {'distance', 'status'}}, verdict) of hashes against reference"""
+    regions = {}
+    for region in REGIONS:
+        distance = hamming(hashes[region], reference[region])
+        if distance <= MATCH_DISTANCE:
+            status = 'match'
+        elif distance >= MISMATCH_DISTANCE:
+            status = 'mismatch'
+        else:
+            status = 'inconclusive'
+        regions[region] = {'distance': distance, 'status': status}
+
+    statuses = {result['status'] for result in regions.values()}
+    if 'mismatch' in statuses:
+        verdict = 'tampered'
+    elif statuses == {'match'}:
+        verdict = 'genuine'
+    else:
+        verdict = 'inconclusive'
+    return regions, verdict
+
+
+def _opencv():
+    """The cv2 module, imported on first call (None if not installed)"""
+    global _cv2
+    if _cv2 is None:
+        try:
+            import cv2
+            _cv2 = cv2
+        except ImportError:
+            _cv2 = False
+            print("⚠️  OpenCV not installed: tamper checks can't read QR codes")
+    return _cv2 or None
+
+
+def decode_qr(image):
+    """Text of the QR code in image, or None (needs OpenCV)"""
+    cv2 = _opencv()
+    if cv2 is None:
+        return None
+    import numpy  # already loaded by cv2
+    detector = cv2.QRCodeDetector()
+    gray = image.convert('L')
+    text, _, _ = detector.detectAndDecode(numpy.array(gray))
+    if text or gray.width > QR_UPSCALE_MAX_WIDTH:
+        return text or None
+    # Modules under ~2px (a downscaled signed QR) aren't found until enlarged
+    for factor in QR_UPSCALES:
+        enlarged = gray.resize((gray.width * factor, gray.height * factor), Image.Resampling.BICUBIC)
+        text, _, _ = detector.detectAndDecode(numpy.array(enlarged))
+        if text:
+            return text
+    return None
+
+
+# ========== STORAGE ==========
+
+def _signed(value):
+    """Unsigned 64-bit hash as a SQLite INTEGER"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def bands(value):
+    """BANDS slices of BAND_BITS bits of a hash, most significant first"""
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (BAND_BITS * (BANDS - 1 - i))) & mask for i in range(BANDS)]
+
+
+HASH_COLUMNS_SQL = 'cert_id, fingerprint, name_hash, domain_hash, dates_hash, qr_hash'
+
+
+def _row_hashes(row):
+    """(cert_id, fingerprint, hashes); hashes is None for rows stored before QR hashes"""
+    cert_id, fingerprint, *values = row
+    if values[-1] is None:
+        return cert_id, fingerprint, None
+    return cert_id, fingerprint, {region: _unsigned(value) for region, value in zip(REGIONS, values)}
+
+
+def save_hashes(conn, cert_id, fingerprint, hashes):
+    """Store the hashes of cert_id's render (commit is up to the caller)"""
+    conn.execute('''
+        INSERT OR REPLACE INTO region_hashes
+            (cert_id, fingerprint, name_hash, domain_hash, dates_hash, qr_hash,
+             name_band0, name_band1, name_band2, name_band3)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (cert_id, fingerprint, *(_signed(hashes[region]) for region in REGIONS),
+          *bands(hashes['name'])))
+
+
+def load_hashes(conn, cert_id):
+    """(fingerprint, hashes) stored for cert_id, or None (also for rows without a QR hash)"""
+    row = conn.execute(f'SELECT {HASH_COLUMNS_SQL} FROM region_hashes WHERE cert_id = ?',
+                       (cert_id,)).fetchone()
+    if row is None:
+        return None
+    _, fingerprint, hashes = _row_hashes(row)
+    return None if hashes is None else (fingerprint, hashes)
+
+
+def nearest(conn, hashes, limit=5):
+    """
+    [(distance, cert_id, fingerprint, stored hashes)] closest to hashes,
+    summed over all regions, among certificates sharing a name band.
+    """
+    queries = ' UNION '.join(
+        f'SELECT * FROM (SELECT {HASH_COLUMNS_SQL} FROM region_hashes '
+        f'WHERE name_band{i} = ? LIMIT {BAND_LIMIT})' for i in range(BANDS))
+    ranked = []
+    for row in conn.execute(queries, bands(hashes['name'])):
+        cert_id, fingerprint, stored = _row_hashes(row)
+        if stored is None:
+            continue
+        distance = sum(hamming(hashes[region], stored[region]) for region in REGIONS)
+        ranked.append((distance, cert_id, fingerprint, stored))
+    ranked.sort(key=lambda match: match[0])
+    return ranked[:limit]
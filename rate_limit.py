@@ -0,0 +1,222 @@
+"""
+Rate limiting and load shedding.
+
+- Token buckets per client and route. They live in SQLite (RATE_LIMIT_DB,
+  default rate_limits.db) so every gunicorn worker shares them; set
+  RATE_LIMIT_DB=:memory: to keep them per process instead.
+- Concurrency caps per worker for expensive work (name search, cold
+  renders, regeneration). When every slot is taken the request gets a 503
+  at once instead of queueing in front of verifications.
+
+RATE_LIMITS=0 turns the buckets off. Behind a proxy set TRUSTED_PROXIES
+to the number of proxies that append to X-Forwarded-For (1 on Render).
+"""
+
+from contextlib import contextmanager
+from functools import wraps
+from threading import BoundedSemaphore, Lock, local
+import os
+import sqlite3
+import time
+
+from flask import request
+
+from fast_json import json_response
+from http_cache import apply_policy
+
+ENABLED = os.environ.get('RATE_LIMITS', '1') != '0'
+DB_PATH = os.environ.get('RATE_LIMIT_DB', 'rate_limits.db')
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 1 if os.environ.get('RENDER') else 0))
+
+# Token buckets per route: (tokens added per second, bucket size)
+LIMITS = {
+    'verify': (5.0, 60),        # QR scans, certificate JSON and images
+    'search': (0.5, 10),        # name search (index scans, fuzzy matching)
+    'listing': (2.0, 20),       # /api/certificates pages and exports
+    'admin': (1 / 300, 2),      # regeneration
+    'upload': (0.2, 10),        # tamper checks of uploaded images
+}
+
+# Requests per worker allowed to run (or wait) at once
+CONCURRENCY = {
+    'search': 2,
+    'render': 2,
+    'regenerate': 1,
+    'upload': 2,
+}
+
+# Buckets idle this long are full again and can be forgotten
+PRUNE_AFTER = 3600
+PRUNE_EVERY = 1000
+
+
+class RateLimited(Exception):
+    """Client ran out of tokens for a route"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Retry after {retry_after:.0f}s')
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    """All slots for an expensive operation are busy"""
+
+
+def _refill(tokens, updated, now, rate, burst):
+    """(allowed, tokens left, seconds until the next token)"""
+    if tokens is None:
+        tokens = burst
+    else:
+        tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / rate
+
+
+class MemoryBuckets:
+    """Token buckets in a dict (per process)"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = Lock()
+
+    def take(self, key, rate, burst):
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (None, now))
+            allowed, tokens, retry_after = _refill(tokens, updated, now, rate, burst)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > PRUNE_EVERY * 10:
+                cutoff = now - PRUNE_AFTER
+                self._buckets = {k: v for k, v in self._buckets.items() if v[1] >= cutoff}
+        return allowed, retry_after
+
+
+class SqliteBuckets:
+    """Token buckets in a SQLite file shared by all workers"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = local()
+        self._takes = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2, isolation_level=None)
+            # Losing buckets in a crash is harmless, so skip the fsyncs
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')
+            conn.execute('''CREATE TABLE IF NOT EXISTS buckets
+                            (key TEXT PRIMARY KEY,
+                             tokens REAL NOT NULL,
+                             updated REAL NOT NULL)''')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, burst):
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?',
+                                   (key,)).fetchone()
+                tokens, updated = row if row else (None, now)
+                allowed, tokens, retry_after = _refill(tokens, updated, now, rate, burst)
+                conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                             (key, tokens, now))
+                self._takes += 1
+                if self._takes % PRUNE_EVERY == 0:
+                    conn.execute('DELETE FROM buckets WHERE updated < ?', (now - PRUNE_AFTER,))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            # Fail open: a busy limiter must not take verification down with it
+            print(f"⚠️  Rate limiter unavailable: {e}")
+            return True, 0.0
+        return allowed, retry_after
+
+
+_buckets = None
+_slots = {name: BoundedSemaphore(limit) for name, limit in CONCURRENCY.items()}
+
+
+def get_buckets():
+    """Bucket store for RATE_LIMIT_DB, created on first use"""
+    global _buckets
+    if _buckets is None:
+        _buckets = MemoryBuckets() if DB_PATH == ':memory:' else SqliteBuckets(DB_PATH)
+    return _buckets
+
+
+def client_address(remote_addr, forwarded_for=None):
+    """Client IP, read from X-Forwarded-For when behind TRUSTED_PROXIES proxies"""
+    if TRUSTED_PROXIES and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+        # Entries left of the ones our proxies appended are client-controlled
+        if len(hops) >= TRUSTED_PROXIES:
+            return hops[-TRUSTED_PROXIES]
+    return remote_addr or 'unknown'
+
+
+def check(route, client):
+    """Take a token from client's bucket for route; raises RateLimited"""
+    if not ENABLED:
+        return
+    rate, burst = LIMITS[route]
+    allowed, retry_after = get_buckets().take(f'{route}:{client}', rate, burst)
+    if not allowed:
+        raise RateLimited(retry_after)
+
+
+@contextmanager
+def slot(name):
+    """Hold one of CONCURRENCY[name] slots; raises Overloaded if none is free"""
+    semaphore = _slots[name]
+    if not semaphore.acquire(blocking=False):
+        raise Overloaded(name)
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+# ========== FLASK ==========
+
+def limited(route, concurrency=None):
+    """Decorator: rate limit a view per client, optionally capping concurrency"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            check(route, client_address(request.remote_addr,
+                                        request.headers.get('X-Forwarded-For')))
+            if concurrency is None:
+                return view(*args, **kwargs)
+            with slot(concurrency):
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def error_payload(error):
+    """(status, JSON body, Retry-After seconds) for a RateLimited/Overloaded error"""
+    if isinstance(error, RateLimited):
+        return 429, {'success': False, 'message': 'Too many requests, please slow down'}, \
+            max(1, int(error.retry_after + 0.999))
+    return 503, {'success': False, 'message': 'Server busy, please try again shortly'}, 1
+
+
+def _error_response(error):
+    status, payload, retry_after = error_payload(error)
+    response = json_response(payload, status)
+    response.headers['Retry-After'] = str(retry_after)
+    return apply_policy(response, 'no-cache')
+
+
+def init_app(app):
+    """Answer RateLimited with 429 and Overloaded with 503"""
+    app.register_error_handler(RateLimited, _error_response)
+    app.register_error_handler(Overloaded, _error_response)
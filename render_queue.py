@@ -0,0 +1,341 @@
+"""
+NXTSYNC RENDER QUEUE
+====================
+A persistent render work queue shared by every gunicorn worker.
+
+Web workers enqueue (cert ID, fingerprint) jobs and wait for them; a
+small pool of consumer processes renders them. The same certificate
+asked for by several workers at once is rendered once, interactive scans
+go ahead of regeneration batches, and total render CPU is bounded by the
+number of consumers instead of the number of web threads.
+
+The queue lives in SQLite (RENDER_QUEUE_DB, default render_queue.db).
+gunicorn.conf.py starts RENDER_QUEUE_PROCESSES consumers (default 1) next
+to the web workers; they can also run on their own:
+
+    python render_queue.py --processes 2
+
+Consumers write a heartbeat. When none is alive (e.g. under the Flask
+dev server) the app renders inline as before.
+"""
+
+from threading import Event
+import argparse
+import os
+import signal
+import socket
+import sqlite3
+import sys
+import time
+import traceback
+
+DB_PATH = os.environ.get('RENDER_QUEUE_DB', 'render_queue.db')
+PROCESSES = int(os.environ.get('RENDER_QUEUE_PROCESSES', 1))
+
+# Lower runs first
+INTERACTIVE = 0
+BATCH = 10
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BATCH: 'batch'}
+
+POLL_INTERVAL = 0.05        # seconds between checks while waiting for a job
+IDLE_INTERVAL = 0.1         # seconds a consumer sleeps when the queue is empty
+HEARTBEAT_INTERVAL = 2.0
+HEARTBEAT_TIMEOUT = 10.0    # consumers silent this long are considered gone
+LEASE = 120.0               # running jobs older than this are handed out again
+KEEP_FINISHED = 86400       # seconds finished jobs are kept for dedup/stats
+
+JOB_COLUMNS = ('id', 'cert_id', 'fingerprint', 'name', 'domain', 'start_date', 'end_date')
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY,
+        cert_id TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        priority INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        domain TEXT NOT NULL,
+        start_date TEXT,
+        end_date TEXT,
+        status TEXT NOT NULL DEFAULT 'queued',
+        error TEXT,
+        enqueued_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        UNIQUE (cert_id, fingerprint)
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_status_priority ON jobs (status, priority, id);
+    CREATE TABLE IF NOT EXISTS consumers (
+        name TEXT PRIMARY KEY,
+        heartbeat REAL NOT NULL
+    );
+'''
+
+
+def connect(path=None):
+    """Open the queue database, creating the tables on first use"""
+    conn = sqlite3.connect(path or DB_PATH, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _transaction(conn, work):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        result = work()
+        conn.execute('COMMIT')
+        return result
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+# ========== PRODUCERS ==========
+
+def _enqueue(conn, job, priority, now):
+    """Insert a job or revive the existing (cert_id, fingerprint) one"""
+    cert_id, fingerprint, name, domain, start_date, end_date = job
+    conn.execute('''
+        INSERT INTO jobs (cert_id, fingerprint, priority, name, domain,
+                          start_date, end_date, enqueued_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (cert_id, fingerprint) DO UPDATE SET
+            priority = min(priority, excluded.priority),
+            status = CASE WHEN status IN ('done', 'failed') THEN 'queued' ELSE status END,
+            enqueued_at = CASE WHEN status IN ('done', 'failed')
+                               THEN excluded.enqueued_at ELSE enqueued_at END
+    ''', (cert_id, fingerprint, priority, name, domain, start_date, end_date, now))
+    return conn.execute('SELECT id FROM jobs WHERE cert_id = ? AND fingerprint = ?',
+                        (cert_id, fingerprint)).fetchone()[0]
+
+
+def enqueue(conn, job, priority=INTERACTIVE):
+    """
+    Queue (cert_id, fingerprint, name, domain, start_date, end_date) and
+    return its job id. A queued or running job for the same cert ID and
+    fingerprint is reused (and bumped to the higher priority).
+    """
+    return _transaction(conn, lambda: _enqueue(conn, job, priority, time.time()))
+
+
+def enqueue_many(conn, jobs, priority=BATCH, batch_size=500):
+    """Queue an iterable of jobs in batched transactions; returns the count"""
+    count = 0
+    batch = []
+
+    def flush():
+        now = time.time()
+        for job in batch:
+            _enqueue(conn, job, priority, now)
+
+    for job in jobs:
+        batch.append(job)
+        if len(batch) >= batch_size:
+            _transaction(conn, flush)
+            count += len(batch)
+            batch = []
+    if batch:
+        _transaction(conn, flush)
+        count += len(batch)
+    return count
+
+
+def wait(conn, job_id, timeout):
+    """Final status of job_id ('done' / 'failed'), or None on timeout"""
+    deadline = time.monotonic() + timeout
+    while True:
+        row = conn.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row and row[0] in ('done', 'failed'):
+            return row[0]
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(POLL_INTERVAL)
+
+
+def render_and_wait(job, timeout, priority=INTERACTIVE):
+    """Queue job and block until it is rendered; 'done', 'failed' or None"""
+    conn = connect()
+    try:
+        return wait(conn, enqueue(conn, job, priority), timeout)
+    finally:
+        conn.close()
+
+
+def consumers_running(conn=None):
+    """Whether at least one consumer has sent a recent heartbeat"""
+    own = conn is None
+    if own:
+        try:
+            conn = connect()
+        except sqlite3.Error:
+            return False
+    try:
+        row = conn.execute('SELECT 1 FROM consumers WHERE heartbeat > ? LIMIT 1',
+                           (time.time() - HEARTBEAT_TIMEOUT,)).fetchone()
+        return row is not None
+    finally:
+        if own:
+            conn.close()
+
+
+def stats(conn):
+    """Job counts by status and priority, plus live consumers"""
+    counts = {}
+    for status, priority, count in conn.execute(
+            'SELECT status, priority, COUNT(*) FROM jobs GROUP BY status, priority'):
+        counts.setdefault(status, {})[PRIORITY_NAMES.get(priority, str(priority))] = count
+    consumers = conn.execute('SELECT COUNT(*) FROM consumers WHERE heartbeat > ?',
+                             (time.time() - HEARTBEAT_TIMEOUT,)).fetchone()[0]
+    return {'jobs': counts, 'consumers': consumers}
+
+
+# ========== CONSUMERS ==========
+
+def claim(conn):
+    """Take the most urgent queued job; returns a JOB_COLUMNS dict or None"""
+    def work():
+        row = conn.execute(f'''
+            SELECT {", ".join(JOB_COLUMNS)} FROM jobs
+            WHERE status = 'queued'
+            ORDER BY priority, id
+            LIMIT 1
+        ''').fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                     (time.time(), row[0]))
+        return dict(zip(JOB_COLUMNS, row))
+    return _transaction(conn, work)
+
+
+def finish(conn, job_id, error=None):
+    conn.execute('UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?',
+                 ('failed' if error else 'done', error, time.time(), job_id))
+
+
+def housekeeping(conn, name):
+    """Heartbeat, hand out jobs of dead consumers again, drop old finished jobs"""
+    now = time.time()
+    conn.execute('INSERT OR REPLACE INTO consumers (name, heartbeat) VALUES (?, ?)', (name, now))
+    conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running' AND started_at < ?",
+                 (now - LEASE,))
+    conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                 (now - KEEP_FINISHED,))
+    conn.execute('DELETE FROM consumers WHERE heartbeat < ?', (now - KEEP_FINISHED,))
+
+
+def consume(render, stop):
+    """
+    Render jobs until stop (an Event) is set. render(job) gets a
+    JOB_COLUMNS dict and returns True on success.
+    """
+    name = f'{socket.gethostname()}:{os.getpid()}'
+    conn = connect()
+    last_beat = 0.0
+    try:
+        while not stop.is_set():
+            if time.monotonic() - last_beat >= HEARTBEAT_INTERVAL:
+                housekeeping(conn, name)
+                last_beat = time.monotonic()
+
+            job = claim(conn)
+            if job is None:
+                stop.wait(IDLE_INTERVAL)
+                continue
+
+            try:
+                error = None if render(job) else 'Render failed'
+            except Exception as e:
+                error = str(e)
+            finish(conn, job['id'], error)
+    finally:
+        conn.execute('DELETE FROM consumers WHERE name = ?', (name,))
+        conn.close()
+
+
+def _consumer_main(render):
+    stop = Event()
+    # Forked from the gunicorn master: drop its signal handlers
+    for sig in (signal.SIGHUP, signal.SIGQUIT, signal.SIGCHLD, signal.SIGUSR1,
+                signal.SIGUSR2, signal.SIGTTIN, signal.SIGTTOU, signal.SIGWINCH):
+        signal.signal(sig, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # SIGTERM finishes the current job, then exits
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    consume(render, stop)
+
+
+# Plain fork() rather than multiprocessing: gunicorn workers forked later
+# would inherit multiprocessing's child list and try to join it on exit
+_pids = []
+
+
+def start_consumers(render, processes=PROCESSES):
+    """Fork consumer processes (called from the gunicorn master)"""
+    for _ in range(processes):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                _consumer_main(render)
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                os._exit(status)
+        _pids.append(pid)
+    print(f"🧵 Render queue: {processes} consumer process(es)")
+
+
+def stop_consumers(timeout=10):
+    """Let consumers finish their current job, then stop them"""
+    for pid in _pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    deadline = time.monotonic() + timeout
+    for pid in _pids:
+        while True:
+            try:
+                exited, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                break  # already reaped (the gunicorn master reaps children too)
+            if exited:
+                break
+            if time.monotonic() >= deadline:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                break
+            time.sleep(0.1)
+    _pids.clear()
+
+
+# ========== CLI ==========
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run render queue consumers.')
+    parser.add_argument('--processes', type=int, default=PROCESSES,
+                        help='consumer processes (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    from app import render_job
+
+    stop = Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    start_consumers(render_job, args.processes)
+    try:
+        while not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    print("\n⏸️  Stopping consumers")
+    stop_consumers()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
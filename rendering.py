@@ -0,0 +1,272 @@
+"""
+NXTSYNC CERTIFICATE RENDERER
+============================
+Draws certificates onto a blank template. One renderer can be reused for
+many certificates: the canvas, the QR scratch images and the fonts are
+allocated once, so memory stays flat during big regenerations.
+"""
+
+from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache
+import hashlib
+import io
+import json
+import qrcode
+import os
+
+from fingerprints import certificate_fingerprint, record_fingerprint
+import perceptual
+from signing import verification_url
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Fonts tried in order (Linux on Render, then Windows for local runs)
+FONT_CANDIDATES = [
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSerif-Italic.ttf",
+     "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+     "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"),
+    ("C:\\Windows\\Fonts\\georgiai.ttf",
+     "C:\\Windows\\Fonts\\arialbd.ttf",
+     "C:\\Windows\\Fonts\\arial.ttf"),
+]
+
+# Text positions (fractions of image height)
+POSITIONS = {
+    'name_y': 0.515,
+    'name_underline': 0.572,
+    'text1_y': 0.633,
+    'domain_y': 0.673,
+    'text2_y': 0.712,
+    'qr_y': 0.78
+}
+
+FONT_SIZES = {
+    'name': 60,
+    'domain': 26,
+    'text': 19
+}
+
+COLORS = {
+    'name': (184, 134, 86),       # Gold/tan for name
+    'text': (0, 0, 0),            # Black for text
+    'underline': (128, 128, 128)  # Gray for underline
+}
+
+QR_SIZE = 140
+# Signed URLs need more modules; grow the QR (up to QR_MAX_SIZE) to keep them scannable
+QR_MIN_MODULE_PX = 3
+QR_MAX_SIZE = 180
+
+
+def load_fonts(sizes=FONT_SIZES):
+    """Load (name, domain, text) fonts, falling back to PIL's default"""
+    return _load_fonts(sizes['name'], sizes['domain'], sizes['text'])
+
+
+@lru_cache(maxsize=None)
+def _load_fonts(name_size, domain_size, text_size):
+    for name_path, domain_path, text_path in FONT_CANDIDATES:
+        try:
+            return (ImageFont.truetype(name_path, name_size),
+                    ImageFont.truetype(domain_path, domain_size),
+                    ImageFont.truetype(text_path, text_size))
+        except OSError:
+            continue
+    print("⚠️ Using default fonts")
+    default = ImageFont.load_default()
+    return default, default, default
+
+
+def reset_peak_rss():
+    """
+    Restart peak_rss_mb() from the current resident memory, so it measures
+    what follows rather than the process lifetime. Linux only; returns
+    False where it isn't supported.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None if unknown)"""
+    try:
+        # Linux: the high-water mark reset_peak_rss() rewinds
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    if os.uname().sysname == 'Darwin':
+        return round(peak / (1024 * 1024), 1)
+    return round(peak / 1024, 1)
+
+
+class CertificateTemplate:
+    """A blank template image and its layout, decoded once"""
+
+    def __init__(self, key, path, positions=None, colors=None, font_sizes=None):
+        self.key = key
+        self.path = path
+        self.positions = {**POSITIONS, **(positions or {})}
+        self.colors = {**COLORS, **{k: tuple(v) for k, v in (colors or {}).items()}}
+        self.font_sizes = {**FONT_SIZES, **(font_sizes or {})}
+
+        self.mtime = os.stat(path).st_mtime
+        with open(path, 'rb') as f:
+            data = f.read()
+        with Image.open(io.BytesIO(data)) as image:
+            self.image = image.convert('RGB')
+        # Part of render fingerprints: editing, reloading or remapping a
+        # template expires the images rendered from the old one
+        layout = json.dumps([key, self.positions, self.colors, self.font_sizes], sort_keys=True)
+        self.version = hashlib.sha256(data + layout.encode('utf-8')).hexdigest()[:12]
+        self.fonts = load_fonts(self.font_sizes)
+
+    @property
+    def size(self):
+        return self.image.size
+
+
+class CertificateRenderer:
+    """Reusable certificate renderer with preallocated buffers"""
+
+    def __init__(self, template, base_url):
+        """template is a CertificateTemplate or a path to a template image"""
+        if isinstance(template, str):
+            template = CertificateTemplate('default', template)
+        self.base_url = base_url
+        self.template = template
+        self.width, self.height = template.size
+
+        # Preallocated canvas, reset from the template before every render
+        self.canvas = template.image.copy()
+        self.draw = ImageDraw.Draw(self.canvas)
+        self.name_font, self.domain_font, self.text_font = template.fonts
+
+        self.qr = qrcode.QRCode(version=1, box_size=1, border=2)
+        # QR module buffers keyed by module count (changes with QR version)
+        self._qr_scratch = {}
+        # perceptual.region_hashes() of the last render
+        self.region_hashes = None
+
+    def _qr_image(self, url):
+        """Build the verification QR for url using the scratch buffers"""
+        self.qr.clear()
+        self.qr.add_data(url)
+        self.qr.make(fit=True)
+        matrix = self.qr.get_matrix()
+        modules = len(matrix)
+
+        scratch = self._qr_scratch.get(modules)
+        if scratch is None:
+            scratch = Image.new('L', (modules, modules), 255)
+            self._qr_scratch[modules] = scratch
+        scratch.putdata([0 if cell else 255 for row in matrix for cell in row])
+
+        size = max(QR_SIZE, min(QR_MAX_SIZE, modules * QR_MIN_MODULE_PX))
+        # Nearest keeps the modules crisp when blowing the matrix up
+        return scratch.resize((size, size), Image.Resampling.NEAREST)
+
+    def render(self, name, domain, start_date, end_date, cert_id, output_path):
+        """Draw one certificate and save it to output_path"""
+        width, height = self.width, self.height
+        positions = self.template.positions
+        colors = self.template.colors
+        self.canvas.paste(self.template.image)
+        draw = self.draw
+
+        center_x = width // 2
+
+        # Name
+        name_y = int(height * positions['name_y'])
+        draw.text((center_x, name_y), name, fill=colors['name'],
+                  font=self.name_font, anchor="mm")
+
+        # Underline
+        underline_y = int(height * positions['name_underline'])
+        underline_length = 300
+        draw.line([center_x - underline_length, underline_y,
+                   center_x + underline_length, underline_y],
+                  fill=colors['underline'], width=2)
+
+        # Text line 1
+        text1_y = int(height * positions['text1_y'])
+        text1 = "has successfully completed the internship "
+        draw.text((center_x, text1_y), text1, fill=colors['text'],
+                  font=self.text_font, anchor="mm")
+
+        # Domain
+        domain_y = int(height * positions['domain_y'])
+        draw.text((center_x, domain_y), domain, fill=colors['text'],
+                  font=self.domain_font, anchor="mm")
+
+        # Text line 2
+        dates_y = int(height * positions['text2_y'])
+        dates_text = f"conducted by Nxtsync from {start_date} to {end_date}."
+        draw.text((center_x, dates_y), dates_text, fill=colors['text'],
+                  font=self.text_font, anchor="mm")
+
+        # QR code
+        qr_img = self._qr_image(verification_url(self.base_url, cert_id, name, domain,
+                                                 start_date, end_date))
+        qr_x = center_x - (qr_img.width // 2)
+        # Larger (signed) QR codes grow upwards, clear of the footer artwork
+        qr_y = int(height * positions['qr_y']) + QR_SIZE - qr_img.height
+        self.canvas.paste(qr_img, (qr_x, qr_y))
+
+        self.region_hashes = perceptual.region_hashes(self.canvas, self.template)
+
+        # Write then rename, so a certificate being served is never half-written
+        tmp_path = f'{output_path}.{os.getpid()}.tmp'
+        self.canvas.save(tmp_path, 'JPEG', quality=95)
+        os.replace(tmp_path, output_path)
+        # Lets servers tell a current image from one of an older row version
+        record_fingerprint(output_path, certificate_fingerprint(
+            cert_id, name, domain, start_date, end_date, self.base_url, self.template.version))
+        return output_path
+
+
+def render_batch(rows, renderer_for, output_folder, end_date_for, on_rendered=None):
+    """
+    Render every (cert_id, name, domain, issue_date) row.
+
+    renderer_for(domain) returns the (reused) renderer for a row's domain.
+    on_rendered(row, region_hashes), if given, is called after each render.
+
+    rows can be any iterator (see db.iter_rows); only a running count and the
+    failed IDs are kept, so memory does not grow with the number of rows.
+    peak_rss_mb is the peak during the batch where reset_peak_rss() works
+    (batch_peak True), else the process lifetime peak.
+    """
+    summary = {'generated': 0, 'failed': [], 'peak_rss_mb': None}
+    summary['batch_peak'] = reset_peak_rss()
+    start_rss = peak_rss_mb()
+
+    for cert_id, name, domain, issue_date in rows:
+        output_path = os.path.join(output_folder, f'{cert_id}.jpg')
+        try:
+            renderer = renderer_for(domain)
+            renderer.render(name, domain, issue_date, end_date_for(issue_date),
+                            cert_id, output_path)
+            if on_rendered:
+                on_rendered((cert_id, name, domain, issue_date), renderer.region_hashes)
+            summary['generated'] += 1
+        except Exception as e:
+            print(f"❌ {cert_id}: {e}")
+            summary['failed'].append(cert_id)
+
+    summary['peak_rss_mb'] = peak_rss_mb()
+    summary['start_rss_mb'] = start_rss
+    return summary
@@ -0,0 +1,104 @@
+"""
+NXTSYNC CERTIFICATE SIGNING
+===========================
+Compact signed verification tokens, so a scan can be validated without
+a database lookup and certificate IDs can't simply be enumerated.
+
+A token is base64url(fields) + '.' + base64url(HMAC-SHA256(fields)[:12])
+where fields are the certificate ID, name, domain, start and end date.
+It goes into the QR code as {base_url}/v/{token}.
+
+Signing is on when CERT_SIGNING_KEY is set (any long random string).
+Every worker, and anything else that validates tokens (an edge function,
+the batch generator), needs the same key. HMAC was chosen over Ed25519
+to stay on the standard library; validators therefore hold the secret.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+
+TOKEN_VERSION = 'v1'
+FIELDS = ('id', 'name', 'domain', 'start_date', 'end_date')
+SIGNATURE_BYTES = 12
+SEPARATOR = '\x1f'
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+class InvalidToken(ValueError):
+    """Token is malformed or its signature doesn't match"""
+
+
+class Signer:
+    """Signs and validates certificate tokens with one HMAC key"""
+
+    def __init__(self, key):
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        # Keyed once; every signature copies this state instead of re-keying
+        self._prototype = hmac.new(key, TOKEN_VERSION.encode('ascii'), hashlib.sha256)
+        self.key_id = hashlib.sha256(key).hexdigest()[:8]
+
+    def _signature(self, payload):
+        mac = self._prototype.copy()
+        mac.update(payload)
+        return mac.digest()[:SIGNATURE_BYTES]
+
+    def sign(self, cert_id, name, domain, start_date, end_date):
+        """Token for one certificate"""
+        payload = SEPARATOR.join(
+            str(field or '') for field in (cert_id, name, domain, start_date, end_date)
+        ).encode('utf-8')
+        return f'{_b64encode(payload)}.{_b64encode(self._signature(payload))}'
+
+    def sign_batch(self, rows):
+        """Yield (cert_id, token) for (cert_id, name, domain, start, end) rows"""
+        for row in rows:
+            yield row[0], self.sign(*row)
+
+    def verify(self, token):
+        """Fields dict of a valid token; raises InvalidToken otherwise"""
+        try:
+            encoded_payload, encoded_signature = token.rsplit('.', 1)
+            payload = _b64decode(encoded_payload)
+            signature = _b64decode(encoded_signature)
+        except (ValueError, TypeError):
+            raise InvalidToken('Malformed token')
+
+        if not hmac.compare_digest(signature, self._signature(payload)):
+            raise InvalidToken('Bad signature')
+
+        values = payload.decode('utf-8', errors='replace').split(SEPARATOR)
+        if len(values) != len(FIELDS):
+            raise InvalidToken('Malformed token')
+        return dict(zip(FIELDS, values))
+
+
+_signer = None
+
+
+def get_signer():
+    """Signer for CERT_SIGNING_KEY, or None when signing isn't configured"""
+    global _signer
+    key = os.environ.get('CERT_SIGNING_KEY')
+    if not key:
+        return None
+    if _signer is None:
+        _signer = Signer(key)
+    return _signer
+
+
+def verification_url(base_url, cert_id, name, domain, start_date, end_date):
+    """URL for the QR code: signed when a key is configured, else /verify/<id>"""
+    signer = get_signer()
+    if signer is None:
+        return f"{base_url}/verify/{cert_id}"
+    return f"{base_url}/v/{signer.sign(cert_id, name, domain, start_date, end_date)}"
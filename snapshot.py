@@ -0,0 +1,103 @@
+"""
+NXTSYNC CERTIFICATE SNAPSHOT
+============================
+Read-only in-memory copy of the certificates table, so lookups and name
+searches never touch SQLite on the hot path.
+
+Rows are kept column-wise (array('I') for pks and domain numbers, shared
+strings for the rest) with dict indexes by certificate ID and name key
+and a name_key-sorted order for prefix search. A snapshot is immutable:
+when db.data_version() moves (an import happened) a new one is loaded
+and swapped in whole.
+"""
+
+from array import array
+from bisect import bisect_left
+import sys
+
+import db
+
+
+class CertificateSnapshot:
+    """The certificates table as of one data_version"""
+
+    __slots__ = ('version', 'pks', 'ids', 'names', 'name_keys', 'domain_numbers',
+                 'domains', 'issue_dates', 'by_id', 'by_name_key', 'key_order')
+
+    def __init__(self, version):
+        self.version = version
+        self.pks = array('I')
+        self.ids = []
+        self.names = []
+        self.name_keys = []
+        self.domain_numbers = array('I')
+        self.domains = []
+        self.issue_dates = []
+        self.by_id = {}
+        self.by_name_key = {}
+        self.key_order = array('I')
+
+    def __len__(self):
+        return len(self.pks)
+
+    @classmethod
+    def load(cls, conn):
+        """Read every certificate in one read transaction"""
+        conn.execute('BEGIN')
+        try:
+            snapshot = cls(db.data_version(conn))
+            rows = conn.execute('SELECT pk, id, name, name_key, domain, issue_date '
+                                'FROM certificate_details ORDER BY pk')
+            domain_numbers = {}
+            issue_dates = {}
+            for pk, cert_id, name, key, domain, issue_date in db.iter_rows(rows, 1000):
+                row = len(snapshot.pks)
+                snapshot.pks.append(pk)
+                snapshot.ids.append(cert_id)
+                snapshot.names.append(name)
+                # Most keys equal the name; share the string when they do
+                snapshot.name_keys.append(name if key == name else sys.intern(key))
+                number = domain_numbers.get(domain)
+                if number is None:
+                    number = domain_numbers[domain] = len(snapshot.domains)
+                    snapshot.domains.append(domain)
+                snapshot.domain_numbers.append(number)
+                snapshot.issue_dates.append(issue_dates.setdefault(issue_date, issue_date))
+                snapshot.by_id[cert_id] = row
+                # Lowest pk wins, like the name_key index in SQLite
+                snapshot.by_name_key.setdefault(key, row)
+        finally:
+            conn.rollback()
+
+        snapshot.key_order = array('I', sorted(range(len(snapshot.pks)),
+                                               key=snapshot.name_keys.__getitem__))
+        return snapshot
+
+    def _row(self, row):
+        return (self.ids[row], self.names[row],
+                self.domains[self.domain_numbers[row]], self.issue_dates[row])
+
+    def get(self, cert_id):
+        """(id, name, domain, issue_date) like db's DETAIL_COLUMNS, or None"""
+        row = self.by_id.get(cert_id)
+        return None if row is None else self._row(row)
+
+    def find_name(self, key):
+        """First (id, name) by exact, then prefix match on name key (as app.search_by_name)"""
+        row = self.by_name_key.get(key)
+        if row is None:
+            position = bisect_left(self.key_order, key, key=self.name_keys.__getitem__)
+            if position < len(self.key_order):
+                candidate = self.key_order[position]
+                if self.name_keys[candidate].startswith(key):
+                    row = candidate
+        return None if row is None else (self.ids[row], self.names[row])
+
+    def by_pks(self, pks):
+        """{pk: (id, name)} for the pks present in the snapshot"""
+        found = {}
+        for pk in pks:
+            row = bisect_left(self.pks, pk)
+            if row < len(self.pks) and self.pks[row] == pk:
+                found[pk] = (self.ids[row], self.names[row])
+        return found
@@ -0,0 +1,160 @@
+"""
+NXTSYNC TEMPLATE REGISTRY
+=========================
+Discovers certificate templates once and keeps them decoded in memory,
+keyed by name. Renders look templates up by key (or by domain) with a
+dict access instead of scanning directories every time.
+
+Extra templates are declared in static/templates/templates.json:
+
+    {
+        "templates": {
+            "data-science": {
+                "path": "static/templates/data_science.jpg",
+                "positions": {"name_y": 0.5},
+                "colors": {"name": [20, 60, 120]},
+                "font_sizes": {"name": 56}
+            }
+        },
+        "domains": {"Data Science": "data-science"}
+    }
+
+Anything left out of a template's layout falls back to the defaults in
+rendering.py. Files are re-checked by mtime at most every
+refresh_interval seconds.
+"""
+
+from threading import Lock
+import json
+import os
+import time
+
+from rendering import CertificateTemplate
+
+DEFAULT_KEY = 'default'
+MANIFEST_PATH = 'static/templates/templates.json'
+
+# Tried in order for the default template
+POSSIBLE_TEMPLATES = [
+    'static/templates/blank_certificate_template.jpg',
+    'static/templates/template.jpg',
+    'blank_certificate_template.jpg',
+    'template.jpg',
+    'template.png'
+]
+
+SEARCH_LOCATIONS = [
+    'static/templates',
+    'templates',
+    '.'
+]
+
+
+def find_template():
+    """Find the default template file (None if there is none)"""
+    for template_path in POSSIBLE_TEMPLATES:
+        if os.path.exists(template_path):
+            return template_path
+
+    for location in SEARCH_LOCATIONS:
+        if os.path.isdir(location):
+            for file in sorted(os.listdir(location)):
+                if file.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    if 'template' in file.lower() or 'certificate' in file.lower():
+                        return os.path.join(location, file)
+
+    return None
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class TemplateRegistry:
+    """In-memory index of templates by key and by domain"""
+
+    def __init__(self, manifest_path=MANIFEST_PATH, default_path=None,
+                 refresh_interval=5.0):
+        self.manifest_path = manifest_path
+        self.default_path = default_path
+        self.refresh_interval = refresh_interval
+        self.templates = {}
+        self.domains = {}
+        self._manifest_mtime = None
+        self._checked_at = 0.0
+        self._lock = Lock()
+        self.build()
+
+    def build(self):
+        """(Re)discover every template and decode it"""
+        templates = {}
+        domains = {}
+        self._manifest_mtime = _mtime(self.manifest_path)
+
+        entries = {}
+        if self._manifest_mtime is not None:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            entries = manifest.get('templates', {})
+            domains = dict(manifest.get('domains', {}))
+
+        default_path = self.default_path or find_template()
+        if default_path and DEFAULT_KEY not in entries:
+            entries = {DEFAULT_KEY: {'path': default_path}, **entries}
+
+        for key, entry in entries.items():
+            try:
+                templates[key] = CertificateTemplate(
+                    key, entry['path'],
+                    positions=entry.get('positions'),
+                    colors=entry.get('colors'),
+                    font_sizes=entry.get('font_sizes'))
+                print(f"✅ Template '{key}': {entry['path']}")
+            except OSError as e:
+                print(f"⚠️  Template '{key}' unavailable: {e}")
+
+        self.templates = templates
+        self.domains = domains
+        self._checked_at = time.monotonic()
+
+    def refresh(self, force=False):
+        """Reload templates whose file changed since they were loaded"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            if not force and now - self._checked_at < self.refresh_interval:
+                return
+            self._checked_at = now
+
+            if (_mtime(self.manifest_path) != self._manifest_mtime
+                    or DEFAULT_KEY not in self.templates):
+                self.build()
+                return
+
+            for key, template in list(self.templates.items()):
+                mtime = _mtime(template.path)
+                if mtime is None:
+                    print(f"⚠️  Template '{key}' removed: {template.path}")
+                    self.templates.pop(key)
+                elif mtime != template.mtime:
+                    print(f"🔄 Reloading template '{key}'")
+                    self.templates[key] = CertificateTemplate(
+                        key, template.path, template.positions,
+                        template.colors, template.font_sizes)
+
+    def get(self, key=DEFAULT_KEY):
+        """Template for key, falling back to the default (None if missing)"""
+        self.refresh()
+        templates = self.templates
+        return templates.get(key) or templates.get(DEFAULT_KEY)
+
+    def for_domain(self, domain):
+        """Template configured for a domain or cohort"""
+        return self.get(self.domains.get(domain, DEFAULT_KEY))
+
+    def keys(self):
+        return list(self.templates)